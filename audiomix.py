@@ -0,0 +1,116 @@
+from imageio_ffmpeg import get_ffmpeg_exe
+import math
+import os
+import subprocess
+import threading
+import numpy as np
+
+# Optional loudness normalization: the RMS level, in dBFS, each scene's narration is
+# brought to (e.g. -20). Unset leaves the levels as the TTS engine made them.
+AUDIO_LOUDNESS = os.getenv("AUDIO_LOUDNESS")
+# Each piece of the soundtrack fades in and out over this long, so the cuts between pieces do not click
+AUDIO_FADE_MS = float(os.getenv("AUDIO_FADE_MS", "30"))
+# Normalization never raises a peak above -1 dBFS
+PEAK_LIMIT = 10 ** (-1 / 20)
+# Loudness is measured over 50 ms blocks, leaving out blocks quieter than -50 dBFS (pauses)
+LOUDNESS_BLOCK_SECONDS = 0.05
+LOUDNESS_GATE = 10 ** (-50 / 20)
+
+
+def decode_pcm(audio_path, rate):
+    """Decode an audio file to mono float32 samples at `rate`."""
+    result = subprocess.run(
+        [get_ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-i", audio_path,
+         "-f", "f32le", "-ac", "1", "-ar", str(rate), "pipe:1"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.decode(errors='replace').strip()}")
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+
+def loudness_gain(pcm, rate, target_dbfs):
+    """Gain that brings the gated RMS of `pcm` to target_dbfs, limited so no sample passes PEAK_LIMIT."""
+    block = max(1, int(rate * LOUDNESS_BLOCK_SECONDS))
+    blocks = pcm[:len(pcm) // block * block].reshape(-1, block)
+    if not len(blocks):
+        return 1.0
+    block_rms = np.sqrt(np.mean(np.square(blocks, dtype=np.float64), axis=1))
+    voiced = block_rms[block_rms > LOUDNESS_GATE]
+    if not len(voiced):
+        return 1.0
+    rms = np.sqrt(np.mean(np.square(voiced)))
+    peak = np.max(np.abs(pcm))
+    return min(10 ** (target_dbfs / 20) / rms, PEAK_LIMIT / peak)
+
+
+class AudioTrack:
+    """
+    The soundtrack of one video, assembled in memory from each scene's narration.
+
+    add() decodes a scene's audio file once, to PCM at the output sample rate; its
+    sample count gives the scene's exact length in video frames. assemble() lays the
+    scenes and any silent pieces (transitions) end to end on the video's frame grid,
+    so every scene's narration starts with its first frame and the soundtrack ends
+    with the last one, however many scenes there are.
+
+    :param rate: Output sample rate.
+    :param fps: Video frame rate.
+    """
+
+    def __init__(self, rate, fps):
+        self.rate = rate
+        self.fps = fps
+        self._pcm = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, audio_path):
+        """Decode a scene's narration and return its length in video frames."""
+        pcm = decode_pcm(audio_path, self.rate)
+        with self._lock:
+            self._pcm[name] = pcm
+        return self.frames(name)
+
+    def frames(self, name):
+        """Video frames needed to play an added scene's narration to the end."""
+        with self._lock:
+            samples = len(self._pcm[name])
+        return max(1, math.ceil(samples * self.fps / self.rate))
+
+    def assemble(self, pieces):
+        """
+        Build the soundtrack as mono float32 PCM.
+
+        Each scene is normalized to AUDIO_LOUDNESS when that is set. Every piece starts
+        exactly on its first frame and ends with its last, fading in and out over
+        AUDIO_FADE_MS along a quarter sine. Pieces never overlap: a scene's frames
+        always cover its whole narration, so a boundary is a short fade out and in
+        rather than a crossfade, which would start each narration before its scene.
+
+        :param pieces: (name, frames) in video order; name is None for silence.
+        """
+        frame_counts = np.array([frames for _, frames in pieces], dtype=np.int64)
+        starts = np.concatenate([[0], np.cumsum(frame_counts)])
+        # Sample positions of the frame boundaries, rounded once so they never drift
+        bounds = np.rint(starts * self.rate / self.fps).astype(np.int64)
+        track = np.zeros(bounds[-1], dtype=np.float32)
+
+        fade = int(self.rate * AUDIO_FADE_MS / 1000)
+        ramp = np.sin(np.linspace(0, np.pi / 2, fade + 2, dtype=np.float32)[1:-1])
+        with self._lock:
+            pcms = [self._pcm[name] if name is not None else None for name, _ in pieces]
+
+        for index, pcm in enumerate(pcms):
+            if pcm is None:
+                continue
+            start, end = bounds[index], bounds[index + 1]
+            slot = end - start
+            piece = pcm[:slot].copy()
+            if AUDIO_LOUDNESS:
+                piece *= loudness_gain(piece, self.rate, float(AUDIO_LOUDNESS))
+            piece[:fade] *= ramp[:len(piece)]
+            tail = piece[max(0, len(piece) - fade):]
+            tail *= ramp[::-1][fade - len(tail):]
+            track[start:start + len(piece)] += piece
+        np.clip(track, -1, 1, out=track)
+        return track
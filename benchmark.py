@@ -0,0 +1,344 @@
+"""
+Offline benchmark for the generate_clip pipeline.
+
+Runs generate_video_async end to end with local stand-ins for the scene planner
+(canned JSON), the image provider (a synthetic PNG) and TTS (a synthetic MP3), each
+with a configurable fake latency, so results depend on this machine and this code
+only. For every (concurrent jobs, scenes per job) combination it reports per-stage
+latency, throughput, peak RSS of the process tree and encode fps, and writes the
+results as JSON to compare branches:
+
+    python benchmark.py --jobs 1 4 --scenes 1 3 6 --output bench.json
+
+With --motion kenburns every case is also run on the static path, and the motion
+encode fps is checked against a budget relative to it (--motion-budget, by default
+motion must encode at least 0.15x as many frames per second as the still-tuned
+static path). Cases over budget are flagged and make the run exit with status 1.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import inspect
+import json
+import logging
+import os
+import shutil
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+
+# The real provider clients are created at import time and need keys, even though they are never called
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("TOGETHER_API_KEY", "benchmark")
+
+from imageio_ffmpeg import get_ffmpeg_exe
+from PIL import Image
+import numpy as np
+import psutil
+
+import createvideo
+import generateassets
+import main
+import motion
+import scenecreator
+from taskstore import TaskStore
+
+
+class StandInProviders:
+    """Local replacements for createscenes, generate_image and text2speech."""
+
+    def __init__(self, work_dir, scene_seconds, llm_latency, image_latency, tts_latency, image_size=1024):
+        self.scene_seconds = scene_seconds
+        self.llm_latency = llm_latency
+        self.image_latency = image_latency
+        self.tts_latency = tts_latency
+        self.image_path = os.path.join(work_dir, "standin.png")
+        self.audio_path = os.path.join(work_dir, "standin.mp3")
+
+        # Smooth gradient plus noise, so the encoder has something realistic to compress
+        rng = np.random.default_rng(0)
+        y, x = np.mgrid[0:image_size, 0:image_size]
+        base = np.stack([x * 255 // image_size, y * 255 // image_size, (x + y) * 255 // (2 * image_size)], axis=-1)
+        noise = rng.integers(0, 24, size=base.shape)
+        self.frame = np.clip(base + noise, 0, 255).astype(np.uint8)
+        Image.fromarray(self.frame).save(self.image_path)
+
+        subprocess.run(
+            [get_ffmpeg_exe(), "-y", "-loglevel", "error", "-f", "lavfi",
+             "-i", f"sine=frequency=440:duration={scene_seconds}", "-ar", "24000", "-ac", "1",
+             "-c:a", "libmp3lame", self.audio_path],
+            check=True,
+        )
+
+    def _response(self, topic, num_scenes):
+        scenes = [
+            {
+                "image_prompt": f"{topic} image {i}",
+                "text": f"{topic} narration {i}",
+                "summary": f"{topic} summary {i}",
+            }
+            for i in range(num_scenes)
+        ]
+        return "```json\n" + json.dumps({"scenes": scenes}) + "\n```"
+
+    def createscenes(self, topic, num_scenes):
+        time.sleep(self.llm_latency)
+        return self._response(topic, num_scenes)
+
+    def createscenes_stream(self, topic, num_scenes):
+        # The same response, written out a scene at a time over the same total latency
+        parts = self._response(topic, num_scenes).split("}, {")
+        for i, part in enumerate(parts):
+            time.sleep(self.llm_latency / len(parts))
+            yield part if i == len(parts) - 1 else part + "}, {"
+
+    def generate_image(self, prompt, output_filename, output_dir="images", keep_file=True):
+        time.sleep(self.image_latency)
+        if keep_file:
+            os.makedirs(output_dir, exist_ok=True)
+            shutil.copyfile(self.image_path, os.path.join(output_dir, output_filename + ".png"))
+        return self.frame.copy()
+
+    def text2speech(self, text, filename, lang="en", output_dir="Audio"):
+        time.sleep(self.tts_latency)
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, filename + ".mp3")
+        shutil.copyfile(self.audio_path, path)
+        return path
+
+    def install(self):
+        scenecreator.createscenes = self.createscenes
+        scenecreator.createscenes_stream = self.createscenes_stream
+        generateassets.generate_image = self.generate_image
+        generateassets.text2speech = self.text2speech
+
+
+class StageTimer:
+    """
+    Wraps the stage functions generate_video_async calls and records their durations.
+
+    The stages overlap: "scenes" runs until the last scene has streamed in, "segments"
+    is each scene's encode, and "encode" is only what is left after the last asset
+    (the tail of the segments plus the concat).
+    """
+
+    STAGES = {
+        "scenes": (main, "planned_scenes"),
+        "assets": (main, "generate_assets"),
+        "segments": (createvideo, "encode_scene_segment"),
+        "transitions": (createvideo, "encode_transition_segment"),
+        "encode": (main, "create_video"),
+    }
+
+    def __init__(self):
+        self.durations = {stage: [] for stage in self.STAGES}
+        self._lock = threading.Lock()
+        for stage, (module, name) in self.STAGES.items():
+            setattr(module, name, self._wrap(stage, getattr(module, name)))
+
+    def _record(self, stage, started):
+        with self._lock:
+            self.durations[stage].append(time.perf_counter() - started)
+
+    def _wrap(self, stage, func):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                self._record(stage, started)
+                raise
+            if inspect.isgenerator(result):
+                return self._timed_generator(stage, started, result)
+            self._record(stage, started)
+            return result
+        return timed
+
+    def _timed_generator(self, stage, started, generator):
+        try:
+            yield from generator
+        finally:
+            self._record(stage, started)
+
+    def reset(self):
+        with self._lock:
+            for values in self.durations.values():
+                values.clear()
+
+
+class RssSampler(threading.Thread):
+    """Samples the RSS of this process and its children (ffmpeg) to find the peak."""
+
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        process = psutil.Process()
+        while not self._stop_event.is_set():
+            total = 0
+            for proc in [process] + process.children(recursive=True):
+                try:
+                    total += proc.memory_info().rss
+                except psutil.Error:
+                    pass
+            self.peak = max(self.peak, total)
+            time.sleep(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _summary(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max": ordered[-1],
+    }
+
+
+def run_case(concurrency, num_scenes, scene_seconds, timer):
+    timer.reset()
+    task_ids = [str(uuid.uuid4()) for _ in range(concurrency)]
+    job_times = []
+    sampler = RssSampler()
+    sampler.start()
+
+    def run_job(task_id):
+        started = time.perf_counter()
+        # Unique topics keep the scene-plan cache out of the measurement
+        main.generate_video_async(task_id, f"benchmark {task_id}", num_scenes)
+        job_times.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run_job, task_ids))
+    wall = time.perf_counter() - started
+    sampler.stop()
+
+    failures = []
+    output_sizes = []
+    for task_id in task_ids:
+        _, status = main.get_status(task_id)
+        if status["status"] != "Done":
+            failures.append(status["status"])
+        else:
+            output_sizes.append(status["output_bytes"])
+
+    seconds = num_scenes * scene_seconds
+    if createvideo.MOTION != "none":
+        seconds += (num_scenes - 1) * motion.CROSSFADE_SECONDS
+    frames = concurrency * seconds * createvideo.render_profile()["fps"]
+    # The moviepy encoder has no segments, all its encoding is in create_video
+    encode_time = sum(timer.durations["segments"]) + sum(timer.durations["transitions"]) or sum(timer.durations["encode"])
+    return {
+        "concurrent_jobs": concurrency,
+        "scenes": num_scenes,
+        "motion": createvideo.MOTION,
+        "wall_seconds": wall,
+        "jobs_per_minute": concurrency / wall * 60,
+        "job_seconds": _summary(job_times),
+        "stages": {stage: _summary(values) for stage, values in timer.durations.items()},
+        "encode_fps": frames / encode_time if encode_time else None,
+        "peak_rss_mb": sampler.peak / (1024 * 1024),
+        "output_mb": statistics.fmean(output_sizes) / (1024 * 1024) if output_sizes else None,
+        "failures": failures,
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Offline benchmark for the generate_clip pipeline")
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 2, 4], help="Concurrent job counts to run")
+    parser.add_argument("--scenes", type=int, nargs="+", default=[1, 3, 6], help="Scenes per job (1..6)")
+    parser.add_argument("--scene-seconds", type=int, default=5, help="Narration length of each scene")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Fake scene planning latency (s)")
+    parser.add_argument("--image-latency", type=float, default=1.0, help="Fake image generation latency (s)")
+    parser.add_argument("--tts-latency", type=float, default=0.3, help="Fake TTS latency (s)")
+    parser.add_argument("--encoder", choices=["ffmpeg", "moviepy"], default=createvideo.VIDEO_ENCODER)
+    parser.add_argument("--profile", choices=list(createvideo.RENDER_PROFILES), default=createvideo.RENDER_PROFILE)
+    parser.add_argument("--motion", choices=motion.MOTIONS, default=createvideo.MOTION)
+    parser.add_argument("--motion-budget", type=float, default=0.15,
+                        help="Lowest allowed ratio of motion to static encode fps")
+    parser.add_argument("--output", default="bench_output.json", help="Where to write the JSON results")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    createvideo.VIDEO_ENCODER = args.encoder
+    createvideo.RENDER_PROFILE = args.profile
+    createvideo.MOTION = args.motion
+
+    work_dir = tempfile.mkdtemp(prefix="text2clip-bench-")
+    main.BASE_TEMP_DIR = os.path.join(work_dir, "temp")
+    os.makedirs(main.BASE_TEMP_DIR)
+    main.task_store = TaskStore(os.path.join(work_dir, "tasks.db"), main.task_state)
+    try:
+        StandInProviders(
+            work_dir, args.scene_seconds, args.llm_latency, args.image_latency, args.tts_latency
+        ).install()
+        timer = StageTimer()
+
+        cases = []
+        over_budget = 0
+        for concurrency in args.jobs:
+            for num_scenes in args.scenes:
+                if args.motion != "none":
+                    createvideo.MOTION = "none"
+                    static = run_case(concurrency, num_scenes, args.scene_seconds, timer)
+                    createvideo.MOTION = args.motion
+                result = run_case(concurrency, num_scenes, args.scene_seconds, timer)
+                cases.append(result)
+                line = (
+                    f"jobs={concurrency} scenes={num_scenes}: {result['wall_seconds']:.2f}s wall, "
+                    f"{result['jobs_per_minute']:.1f} jobs/min, encode {result['encode_fps'] or 0:.0f} fps, "
+                    f"peak RSS {result['peak_rss_mb']:.0f} MB, output {result['output_mb'] or 0:.2f} MB, "
+                    f"{len(result['failures'])} failed"
+                )
+                if args.motion != "none":
+                    ratio = (result["encode_fps"] or 0) / (static["encode_fps"] or 1)
+                    result["static_encode_fps"] = static["encode_fps"]
+                    result["motion_fps_ratio"] = ratio
+                    result["within_budget"] = ratio >= args.motion_budget
+                    over_budget += not result["within_budget"]
+                    line += (
+                        f", {ratio:.2f}x static {static['encode_fps'] or 0:.0f} fps "
+                        f"({'within' if result['within_budget'] else 'OVER'} {args.motion_budget}x budget)"
+                    )
+                print(line)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "revision": _git_revision(),
+        "cpu_count": os.cpu_count(),
+        "settings": vars(args),
+        "cases": cases,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.motion != "none" and over_budget:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,168 @@
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont
+import math
+import os
+import threading
+import numpy as np
+
+# Scene summaries are burned into each scene's still frame as a caption band along
+# the bottom. CAPTION_FONT_SIZE is for a 1024 px wide frame and scales with the width.
+CAPTIONS = os.getenv("CAPTIONS", "1").lower() in ("1", "true", "yes")
+CAPTION_FONT = os.getenv("CAPTION_FONT", os.path.join(os.path.dirname(os.path.abspath(__file__)), "arial.ttf"))
+CAPTION_FONT_SIZE = int(os.getenv("CAPTION_FONT_SIZE", "48"))
+TEXT_COLOR = np.array([255, 255, 255], dtype=np.float32)
+BAND_COLOR = np.array([0, 0, 0xBB], dtype=np.float32)
+BAND_OPACITY = 0.6
+# Captions never cover more than this share of the frame; longer text is cut off with an ellipsis
+MAX_CAPTION_HEIGHT = 1 / 3
+
+
+class GlyphAtlas:
+    """
+    The glyphs of one font at one size, each rasterized once and then reused.
+
+    A glyph is kept as an 8-bit coverage mask of a full line-height cell with its
+    advance width. Setting a line of text is then only numpy slicing, without a
+    trip through the font renderer.
+    """
+
+    def __init__(self, font_path, size):
+        self.font = ImageFont.truetype(font_path, size)
+        ascent, descent = self.font.getmetrics()
+        self.line_height = ascent + descent
+        self._glyphs = {}
+        self._lock = threading.Lock()
+
+    def glyph(self, char):
+        """Return (mask, advance) for a character."""
+        glyph = self._glyphs.get(char)
+        if glyph is None:
+            advance = self.font.getlength(char)
+            right = self.font.getbbox(char)[2]
+            cell = Image.new("L", (max(1, math.ceil(advance), right), self.line_height), 0)
+            ImageDraw.Draw(cell).text((0, 0), char, font=self.font, fill=255)
+            glyph = (np.asarray(cell), advance)
+            with self._lock:
+                self._glyphs[char] = glyph
+        return glyph
+
+    def measure(self, text):
+        return sum(self.glyph(char)[1] for char in text)
+
+    def render(self, text):
+        """Rasterize one line of text into a coverage mask of shape (line_height, width)."""
+        glyphs = [self.glyph(char) for char in text]
+        width = math.ceil(sum(advance for _, advance in glyphs))
+        if glyphs:
+            width += glyphs[-1][0].shape[1]
+        mask = np.zeros((self.line_height, max(1, width)), dtype=np.uint8)
+        x = 0.0
+        for glyph_mask, advance in glyphs:
+            left = int(round(x))
+            cell = mask[:, left:left + glyph_mask.shape[1]]
+            np.maximum(cell, glyph_mask[:, :cell.shape[1]], out=cell)
+            x += advance
+        return mask
+
+
+@lru_cache(maxsize=16)
+def glyph_atlas(font_path, size):
+    """The shared atlas for a font and size, so every job reuses the same rasterized glyphs."""
+    return GlyphAtlas(font_path, size)
+
+
+def _wrap(atlas, text, max_width):
+    lines = []
+    line = ""
+    for word in text.split():
+        candidate = f"{line} {word}" if line else word
+        if line and atlas.measure(candidate) > max_width:
+            lines.append(line)
+            line = word
+        else:
+            line = candidate
+    if line:
+        lines.append(line)
+    return lines
+
+
+@lru_cache(maxsize=32)
+def _caption_coverage(height, width, text):
+    """
+    Lay out a caption for a frame size.
+
+    Only this 8-bit text mask is cached, not the float overlay built from it (about
+    20x larger), so the cache stays small however many different captions go by.
+
+    :return: (band_top, coverage) with coverage of shape (rows, width), uint8, for the
+        rows from band_top down; None if there is no caption.
+    """
+    text = " ".join((text or "").split())
+    if not text or not CAPTIONS:
+        return None
+
+    atlas = glyph_atlas(CAPTION_FONT, max(8, round(CAPTION_FONT_SIZE * width / 1024)))
+    margin = atlas.line_height // 2
+    lines = _wrap(atlas, text, width - 2 * margin)
+    max_lines = max(1, int(height * MAX_CAPTION_HEIGHT - 2 * margin) // atlas.line_height)
+    if len(lines) > max_lines:
+        last = lines[max_lines - 1]
+        while " " in last and atlas.measure(last + "…") > width - 2 * margin:
+            last = last.rsplit(" ", 1)[0]
+        lines = lines[:max_lines - 1] + [last + "…"]
+
+    # Set the text block, each line centred
+    text_block = np.zeros((len(lines) * atlas.line_height, width), dtype=np.uint8)
+    for index, line in enumerate(lines):
+        mask = atlas.render(line)[:, :width]
+        left = (width - mask.shape[1]) // 2
+        top = index * atlas.line_height
+        text_block[top:top + atlas.line_height, left:left + mask.shape[1]] = mask
+
+    band_top = max(0, height - text_block.shape[0] - 2 * margin)
+    coverage = np.zeros((height - band_top, width), dtype=np.uint8)
+    text_rows = text_block[:coverage.shape[0] - margin]
+    coverage[margin:margin + text_rows.shape[0]] = text_rows
+    coverage.flags.writeable = False
+    return band_top, coverage
+
+
+def caption_overlay(height, width, text):
+    """
+    The caption band for a frame size as a per-pixel gain and offset.
+
+    A captioned band is `band * gain + offset`, which folds the band colour and the text
+    into one multiply-add, so it can also be laid over every frame of a moving scene.
+
+    :return: (band_top, gain, offset), gain of shape (rows, width, 1) and offset of shape
+        (rows, width, 3) as float32 for the rows from band_top down; None if there is no caption.
+    """
+    layout = _caption_coverage(height, width, text)
+    if layout is None:
+        return None
+    band_top, coverage = layout
+    alpha = (coverage / np.float32(255))[:, :, None]
+    # band * (1 - opacity) + band colour * opacity, then text over that with the coverage as alpha
+    gain = (1 - BAND_OPACITY) * (1 - alpha)
+    offset = BAND_COLOR * BAND_OPACITY * (1 - alpha) + TEXT_COLOR * alpha
+    return band_top, gain, offset
+
+
+def caption_frame(frame, text):
+    """
+    Return a copy of an RGB frame with `text` drawn in a caption band at the bottom.
+
+    The caption is set once from the glyph atlas and alpha-blended onto the still
+    frame with numpy, so it costs one blend per scene rather than one per video frame.
+
+    :param frame: RGB uint8 numpy frame.
+    :param text: The caption; the frame is returned unchanged if it is empty or CAPTIONS is off.
+    """
+    overlay = caption_overlay(frame.shape[0], frame.shape[1], text)
+    if overlay is None:
+        return frame
+    band_top, gain, offset = overlay
+
+    captioned = frame.copy()
+    captioned[band_top:] = np.rint(frame[band_top:] * gain + offset).astype(np.uint8)
+    return captioned
@@ -1,93 +1,533 @@
 from moviepy import *
+from imageio_ffmpeg import get_ffmpeg_exe
+from concurrent.futures import ThreadPoolExecutor
+from metrics import STAGE_SECONDS
+from captions import caption_frame
+from motion import MOTION, MOTION_ZOOM, CROSSFADE_SECONDS, SceneMotion, crossfade_batches
+from audiomix import AudioTrack
+from PIL import Image
+import hashlib
 import os
+import subprocess
+import threading
+import numpy as np
 
+# "ffmpeg" drives ffmpeg directly with still-image tuning, "moviepy" renders every frame through moviepy
+VIDEO_ENCODER = os.getenv("VIDEO_ENCODER", "ffmpeg")
 
+# Quality/speed trade-offs for the x264 + AAC output. The content is a slideshow of
+# stills, so even the lower frame rates and long keyframe intervals look the same;
+# they only cut encode time and file size.
+#   preset/crf: x264 speed and constant quality (lower crf is better and larger)
+#   fps: output frame rate; max_height: downscale taller images (None keeps the size)
+#   keyframe_seconds: seconds between keyframes, i.e. how coarse seeking can be
+#   threads: x264 threads per segment, 0 to share the cores between parallel segments
+#   audio_bitrate/audio_rate: AAC bitrate and sample rate (mono)
+RENDER_PROFILES = {
+    "draft": {
+        "preset": "ultrafast", "crf": 30, "fps": 12, "max_height": 480, "keyframe_seconds": 10,
+        "threads": 0, "audio_bitrate": "64k", "audio_rate": 22050,
+    },
+    "standard": {
+        "preset": "veryfast", "crf": 23, "fps": 24, "max_height": None, "keyframe_seconds": 10,
+        "threads": 0, "audio_bitrate": "128k", "audio_rate": 44100,
+    },
+    "archive": {
+        "preset": "slow", "crf": 20, "fps": 24, "max_height": None, "keyframe_seconds": 10,
+        "threads": 0, "audio_bitrate": "192k", "audio_rate": 48000,
+    },
+}
+RENDER_PROFILE = os.getenv("RENDER_PROFILE", "standard")
+# Scene segments are encoded in parallel, each ffmpeg getting a share of the cores
+SEGMENT_WORKERS = int(os.getenv("SEGMENT_WORKERS", str(os.cpu_count() or 1)))
 
 
-def create_video(audio_dir="Audio", images_dir="images", output_file="output_movie.mp4",scenes_array=None):
-    # Get the list of audio files (ensure sorting is correct)
-    scene_files = sorted([f for f in os.listdir(audio_dir) if f.endswith(".mp3")])
-    #print(scenes_array)
-    # Create a list to hold all video clips
-    video_clips = []
+def _scene_inputs(audio_dir, images_dir, scenes_array, frames=None):
+    """
+    Pair each scene's audio with its image, in scene order, skipping scenes with missing files.
 
-    # Loop through each scene and create a video clip
+    The image is the in-memory frame from `frames` when there is one, else the PNG path.
+    """
+    # Get the list of audio files (ensure sorting is correct); MP3 from gTTS, WAV from local TTS engines
+    scene_files = sorted([f for f in os.listdir(audio_dir) if f.endswith((".mp3", ".wav"))])
+    scenes = []
     for scene_file in scene_files:
-        scene_name = os.path.splitext(scene_file)[0]  # Remove .mp3 extension
-        
-        image_path = os.path.join(images_dir, f"{scene_name}.png")
+        scene_name = os.path.splitext(scene_file)[0]  # Remove the extension
+
+        image = frames.get(scene_name) if frames else None
         audio_path = os.path.join(audio_dir, scene_file)
 
-        # Ensure the image file exists
-        if not os.path.exists(image_path):
-            print(f"Warning: Image file {image_path} not found. Skipping this scene.")
-            continue
+        # Fall back to the image file, and ensure it exists
+        if image is None:
+            image = os.path.join(images_dir, f"{scene_name}.png")
+            if not os.path.exists(image):
+                print(f"Warning: Image file {image} not found. Skipping this scene.")
+                continue
+
+        summary_text = scenes_array[_scene_index(scene_name)].get("summary", "") if scenes_array else ""
+        scenes.append((scene_name, image, audio_path, summary_text))
+    return scenes
+
+
+def _scene_index(scene_name):
+    return int(scene_name.replace("scene", "")) if scene_name.startswith("scene") else 0
+
+
+def _load_frame(image):
+    """An RGB numpy frame for an image given as a frame or a PNG path."""
+    if isinstance(image, np.ndarray):
+        return image
+    with Image.open(image) as img:
+        return np.asarray(img.convert("RGB"))
+
+
+def _captioned(image, caption):
+    """Burn the scene's caption into its image, giving a frame (or the image unchanged if there is none)."""
+    if not caption:
+        return image
+    return caption_frame(_load_frame(image), caption)
+
+
+def _run_ffmpeg(args, input=None):
+    cmd = [get_ffmpeg_exe(), "-y", "-hide_banner", "-loglevel", "error"] + args
+    result = subprocess.run(cmd, input=input, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.decode(errors='replace').strip()}")
+
+
+def _image_input_args(image):
+    if isinstance(image, np.ndarray):
+        # A decoded frame is piped in once as raw RGB and repeated by the loop filter
+        height, width = image.shape[:2]
+        return ["-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-framerate", "1", "-i", "pipe:0"]
+    return ["-loop", "1", "-framerate", "1", "-i", image]
+
+
+def render_profile(name=None):
+    """Return the settings of a render profile, RENDER_PROFILE by default."""
+    name = name or RENDER_PROFILE
+    if name not in RENDER_PROFILES:
+        raise ValueError(f"Unknown render profile {name!r}, expected one of {', '.join(RENDER_PROFILES)}")
+    return RENDER_PROFILES[name]
+
+
+def _scale_filter(max_height):
+    # x264 with yuv420p needs even dimensions
+    if max_height is None:
+        return "scale=trunc(iw/2)*2:trunc(ih/2)*2"
+    return f"scale=-2:trunc(min(ih\\,{max_height})/2)*2"
+
+
+def _output_size(shape, max_height):
+    """(width, height) of the video for an image of this shape, the same as _scale_filter gives."""
+    height, width = shape[:2]
+    out_height = min(height, max_height or height) // 2 * 2
+    return round(width * out_height / height / 2) * 2, out_height
+
+
+def _codec_args(settings, threads=0, tune=None):
+    """The x264 output options, shared by every segment of a profile so they join without re-encoding."""
+    return ["-c:v", "libx264"] + (["-tune", tune] if tune else []) + [
+        "-preset", settings["preset"], "-crf", str(settings["crf"]),
+        "-pix_fmt", "yuv420p", "-r", str(settings["fps"]), "-g", str(settings["fps"] * settings["keyframe_seconds"]),
+        "-threads", str(settings["threads"] or threads),
+        # Segments are video only, the soundtrack is added when they are joined
+        "-an",
+    ]
+
+
+def _segment_args(image, frames, segment_path, threads=0, profile=None):
+    settings = render_profile(profile)
+    video_filter = _scale_filter(settings["max_height"])
+    if isinstance(image, np.ndarray):
+        video_filter = "loop=loop=-1:size=1:start=0," + video_filter
+    return _image_input_args(image) + [
+        "-vf", video_filter,
+    ] + _codec_args(settings, threads, tune="stillimage") + [
+        # The looped image never ends, stop after exactly the scene's frames
+        "-frames:v", str(frames),
+        segment_path,
+    ]
+
 
-        # Load the audio file
+def _segment_key(image, profile=None, extra=()):
+    """
+    Hash the segment's inputs and encoder settings, to tell whether it needs re-encoding.
+
+    :param extra: Further settings the segment depends on, such as its length in frames.
+    """
+    digest = hashlib.sha256()
+    if isinstance(image, np.ndarray):
+        digest.update(str(image.shape).encode("utf-8"))
+        digest.update(np.ascontiguousarray(image).data)
+    else:
+        with open(image, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    digest.update(" ".join(_segment_args("", 0, "", profile=profile)).encode("utf-8"))
+    digest.update(repr(extra).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _is_current(segment_path, key):
+    key_file = segment_path + ".key"
+    if os.path.exists(segment_path) and os.path.exists(key_file):
+        with open(key_file) as f:
+            return f.read() == key
+    return False
+
+
+def _pipe_frames(batches, size, segment_path, threads=0, profile=None):
+    """
+    Encode frames written to ffmpeg's stdin as raw video into an MP4 segment.
+
+    :param batches: Iterable of uint8 RGBX frame batches of shape (frames, height, width, 4).
+    :param size: Frame (width, height).
+    """
+    settings = render_profile(profile)
+    width, height = size
+    cmd = [
+        get_ffmpeg_exe(), "-y", "-hide_banner", "-loglevel", "error",
+        "-f", "rawvideo", "-pix_fmt", "rgb0", "-s", f"{width}x{height}", "-framerate", str(settings["fps"]), "-i", "pipe:0",
+    ] + _codec_args(settings, threads) + [segment_path]
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        for batch in batches:
+            proc.stdin.write(batch.data)
+    except BrokenPipeError:
+        # ffmpeg stopped reading, its error is reported below
+        pass
+    except BaseException:
+        proc.kill()
+        raise
+    finally:
         try:
-            audio_clip = AudioFileClip(audio_path)
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        stderr = proc.stderr.read()
+        proc.wait()
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {stderr.decode(errors='replace').strip()}")
+
+
+def _scene_motion(image, scene_index, caption, settings):
+    frame = _load_frame(image)
+    return SceneMotion(frame, scene_index, _output_size(frame.shape, settings["max_height"]), caption)
+
+
+def encode_scene_segment(image, frames, segment_path, threads=0, profile=None, caption=None, scene_index=0):
+    """
+    Encode one still image into a video-only MP4 segment of exactly `frames` frames.
+
+    The image is either a PNG path or an RGB numpy frame, which is piped to ffmpeg
+    without touching the disk. Either way ffmpeg decodes it once per second of input
+    at most and duplicates it up to the profile's fps, and x264 is tuned for still images, so the
+    repeated frames are cheap to encode. Every segment uses the same codec parameters,
+    which lets them be joined later without re-encoding. The narration is not part of
+    the segment; it goes into the one soundtrack added when the segments are joined.
+
+    With MOTION set the scene moves instead: its Ken Burns frames are computed in
+    numpy (see motion.SceneMotion) and piped to ffmpeg as raw video, and x264 is not
+    tuned for stills. The caption is laid over the moving frames.
+
+    A segment whose image, length and settings are unchanged since the last encode is
+    kept as it is, so re-rendering after one scene changed only redoes that scene.
+
+    :param frames: Length of the scene in frames (see audiomix.AudioTrack.add).
+    :param profile: Name of the render profile (see RENDER_PROFILES).
+    :param caption: Optional caption burned into the video.
+    :param scene_index: Position of the scene in the video, which picks its motion.
+    :return: True if the segment was encoded, False if the existing one was reused.
+    """
+    if MOTION == "none":
+        image = _captioned(image, caption)
+        key = _segment_key(image, profile, (frames,))
+    else:
+        key = _segment_key(image, profile, (frames, MOTION, MOTION_ZOOM, scene_index, caption))
+    if _is_current(segment_path, key):
+        return False
+
+    with STAGE_SECONDS.time(stage="segment"):
+        if MOTION == "none":
+            frame_bytes = np.ascontiguousarray(image, dtype=np.uint8).tobytes() if isinstance(image, np.ndarray) else None
+            _run_ffmpeg(_segment_args(image, frames, segment_path, threads, profile), input=frame_bytes)
+        else:
+            scene = _scene_motion(image, scene_index, caption, render_profile(profile))
+            _pipe_frames(scene.batches(frames), (scene.width, scene.height), segment_path, threads, profile)
+    with open(segment_path + ".key", "w") as f:
+        f.write(key)
+    return True
+
+
+def transition_frames(profile=None):
+    """Length in frames of the crossfade between two moving scenes."""
+    return max(1, round(CROSSFADE_SECONDS * render_profile(profile)["fps"]))
+
+
+def encode_transition_segment(outgoing, incoming, segment_path, threads=0, profile=None):
+    """
+    Encode the crossfade between two moving scenes into a video-only MP4 segment.
+
+    It blends the last frame of the outgoing scene's motion into the first frame of
+    the incoming one over transition_frames(), and is joined between their segments
+    (over silence in the soundtrack).
+
+    :param outgoing: (image, caption, scene_index) of the scene before.
+    :param incoming: (image, caption, scene_index) of the scene after.
+    :return: True if the segment was encoded, False if the existing one was reused.
+    """
+    frames = transition_frames(profile)
+    key = "".join(
+        _segment_key(image, profile, (frames, MOTION, MOTION_ZOOM, scene_index, caption))
+        for image, caption, scene_index in (outgoing, incoming)
+    )
+    if _is_current(segment_path, key):
+        return False
+
+    settings = render_profile(profile)
+    with STAGE_SECONDS.time(stage="transition"):
+        scenes = [_scene_motion(image, scene_index, caption, settings) for image, caption, scene_index in (outgoing, incoming)]
+        _pipe_frames(crossfade_batches(*scenes, frames), (scenes[0].width, scenes[0].height),
+                     segment_path, threads, profile)
+    with open(segment_path + ".key", "w") as f:
+        f.write(key)
+    return True
+
+
+def concat_segments(segment_paths, output_file, soundtrack, profile=None):
+    """
+    Join video-only MP4 segments with the concat demuxer and add the soundtrack.
+
+    The video is copied as it is. The soundtrack is piped in as PCM and encoded to
+    the profile's AAC settings in the same pass, as the file's one audio track.
+
+    :param soundtrack: Mono float32 PCM at the profile's sample rate (see audiomix.AudioTrack).
+    """
+    settings = render_profile(profile)
+    list_file = output_file + ".segments.txt"
+    with open(list_file, "w") as f:
+        for path in segment_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    try:
+        with STAGE_SECONDS.time(stage="concat"):
+            _run_ffmpeg([
+                "-f", "concat", "-safe", "0", "-i", list_file,
+                "-f", "f32le", "-ar", str(settings["audio_rate"]), "-ac", "1", "-i", "pipe:0",
+                "-map", "0:v", "-map", "1:a",
+                "-c:v", "copy",
+                "-c:a", "aac", "-b:a", settings["audio_bitrate"],
+                "-movflags", "+faststart",
+                output_file,
+            ], input=np.ascontiguousarray(soundtrack, dtype=np.float32).tobytes())
+    finally:
+        os.remove(list_file)
+
+
+class SegmentPipeline:
+    """
+    Encodes scene segments in the background as soon as each scene's assets are ready.
+
+    Pass it to create_video, which then only waits for the segments still encoding
+    (and encodes any scene that was never added) before joining them.
+
+    Each scene's narration is decoded into the pipeline's AudioTrack as it is added,
+    which gives the scene's length in frames, and soundtrack() assembles them.
+
+    With MOTION set, the crossfade between two consecutive scenes is encoded as soon
+    as both have been added.
+    """
+
+    def __init__(self, output_file, num_scenes, profile=None):
+        self.profile = profile
+        settings = render_profile(profile)
+        self.audio = AudioTrack(settings["audio_rate"], settings["fps"])
+        # Per profile, so a preview and the full render keep their own segments
+        self.segments_dir = os.path.join(os.path.dirname(output_file), "segments", profile or RENDER_PROFILE)
+        os.makedirs(self.segments_dir, exist_ok=True)
+        # ffmpeg does the work in its own processes, so threads are enough to run the segments in parallel
+        workers = max(1, min(SEGMENT_WORKERS, num_scenes))
+        self.threads = max(1, (os.cpu_count() or 1) // workers)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="segments")
+        self._futures = {}
+        # Scene index -> (image, caption, index) of every scene added, for the crossfades
+        self._added = {}
+        self._transitions = {}
+        self._lock = threading.Lock()
+
+    def segment_path(self, scene_name):
+        return os.path.join(self.segments_dir, f"{scene_name}.mp4")
+
+    def transition_path(self, outgoing, incoming):
+        return os.path.join(self.segments_dir, f"transition{outgoing}-{incoming}.mp4")
+
+    def add(self, scene_name, image, audio_path, caption=None):
+        """Start encoding a scene's segment, with the caption burned into its image."""
+        self._futures[scene_name] = self._pool.submit(self._encode, scene_name, image, audio_path, caption)
+        if MOTION != "none":
+            index = _scene_index(scene_name)
+            with self._lock:
+                self._added[index] = (image, caption, index)
+                for outgoing, incoming in ((index - 1, index), (index, index + 1)):
+                    if outgoing in self._added and incoming in self._added:
+                        self._add_transition(outgoing, incoming)
+
+    def _add_transition(self, outgoing, incoming):
+        if (outgoing, incoming) not in self._transitions:
+            self._transitions[(outgoing, incoming)] = self._pool.submit(
+                encode_transition_segment, self._added[outgoing], self._added[incoming],
+                self.transition_path(outgoing, incoming), threads=self.threads, profile=self.profile
+            )
+
+    def _encode(self, scene_name, image, audio_path, caption):
+        return encode_scene_segment(
+            image, self.audio.add(scene_name, audio_path), self.segment_path(scene_name),
+            threads=self.threads, profile=self.profile, caption=caption, scene_index=_scene_index(scene_name)
+        )
+
+    def started(self, scene_name):
+        return scene_name in self._futures
+
+    def result(self, scene_name, image, audio_path, caption=None):
+        """Wait for a scene's segment, starting it first if it was never added."""
+        if scene_name not in self._futures:
+            self.add(scene_name, image, audio_path, caption)
+        return self._futures[scene_name].result()
+
+    def segment_paths(self, scene_names):
+        """The segments to join for these scenes, in order, with the crossfades between them once they are encoded."""
+        paths = []
+        for previous, scene_name in zip([None] + scene_names, scene_names):
+            if previous is not None and MOTION != "none":
+                outgoing, incoming = _scene_index(previous), _scene_index(scene_name)
+                with self._lock:
+                    self._add_transition(outgoing, incoming)
+                self._transitions[(outgoing, incoming)].result()
+                paths.append(self.transition_path(outgoing, incoming))
+            paths.append(self.segment_path(scene_name))
+        return paths
+
+    def soundtrack(self, scene_names):
+        """The narration of these scenes (once encoded) as one PCM track, lined up with segment_paths()."""
+        pieces = []
+        for scene_name in scene_names:
+            if pieces and MOTION != "none":
+                pieces.append((None, transition_frames(self.profile)))
+            pieces.append((scene_name, self.audio.frames(scene_name)))
+        return self.audio.assemble(pieces)
+
+    def close(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+def segment_pipeline(output_file, num_scenes, encoder=None, profile=None):
+    """Return a SegmentPipeline for the output file, or None when the encoder cannot use one."""
+    if (encoder or VIDEO_ENCODER) == "moviepy":
+        return None
+    return SegmentPipeline(output_file, num_scenes, profile)
+
+
+def _create_video_ffmpeg(scenes, output_file, pipeline=None, profile=None):
+    own_pipeline = pipeline is None
+    if own_pipeline:
+        pipeline = SegmentPipeline(output_file, len(scenes), profile)
+    try:
+        for scene_name, image, audio_path, summary_text in scenes:
+            if not pipeline.started(scene_name):
+                pipeline.add(scene_name, image, audio_path, summary_text)
+        encoded = [pipeline.result(*scene) for scene in scenes]
+        segment_paths = pipeline.segment_paths([scene[0] for scene in scenes])
+    finally:
+        if own_pipeline:
+            pipeline.close()
+    print(f"Encoded {sum(encoded)} of {len(scenes)} scene segments")
+
+    concat_segments(segment_paths, output_file, pipeline.soundtrack([scene[0] for scene in scenes]), profile)
+    print(f"Movie created successfully: {output_file}")
+
+
+def _create_video_moviepy(scenes, output_file, profile=None):
+    """
+    Render through moviepy one scene at a time. MOTION is not applied here.
+
+    Each scene is written to its own video-only segment and its clip is closed right
+    after, so only one scene is held in memory however many there are. The segments
+    share codec settings and are joined without re-encoding, over the soundtrack
+    assembled from the decoded narrations.
+    """
+    settings = render_profile(profile)
+    segments_dir = os.path.join(os.path.dirname(output_file), "segments", f"{profile or RENDER_PROFILE}-moviepy")
+    os.makedirs(segments_dir, exist_ok=True)
+    audio = AudioTrack(settings["audio_rate"], settings["fps"])
+    segment_paths = []
+    pieces = []
+
+    # Loop through each scene and encode it on its own
+    for scene_name, image, audio_path, summary_text in scenes:
+        # Decode the narration, which also gives the scene's length
+        try:
+            frames = audio.add(scene_name, audio_path)
         except Exception as e:
             print(f"Error loading audio {audio_path}: {e}")
             continue
 
-        # Create an ImageClip with the same duration as the audio
-        image_clip = ImageClip(image_path, duration=audio_clip.duration)
-        
-        # Create a TextClip for the summary
-        index=int(scene_name.replace("scene", "")) if scene_name.startswith("scene") else 0
-        summary_text = scenes_array[index].get("summary", "") if scenes_array else ""
+        # Create an ImageClip as long as the narration, captioned with the summary
+        image_clip = ImageClip(_captioned(image, summary_text), duration=frames / settings["fps"])
+        max_height = settings["max_height"]
+        if max_height and image_clip.h > max_height:
+            width = int(image_clip.w * max_height / image_clip.h) // 2 * 2
+            image_clip = image_clip.resized(new_size=(width, max_height // 2 * 2))
         print("summary",summary_text)
-        """
-        text_clip = TextClip(
-            text=summary_text,
-            font="arial.ttf",
-            font_size=72,
-            color="#FFFFFF",
-            bg_color="#0000BB",  # Semi-transparent dark background
-            size=(image_clip.w, None),  # Match the width of the image
-            method="caption",
-            duration=audio_clip.duration,# Match the duration of the audio
-            horizontal_align="center",
-            vertical_align="center",
-        )
-        print("text clip created")
-        """
-        # Overlay the TextClip on the ImageClip
-        #composite_clip = CompositeVideoClip([image_clip, text_clip])
-        
-        # Set the audio of the image clip to the loaded audio
-        #video_clip = composite_clip.with_audio(audio_clip)
-        video_clip = image_clip.set_audio(audio_clip)
-        if video_clip.audio is None:
-            print(f"Error: Audio not attached to {scene_name}")
-        else:
-            print(f"Audio attached to {scene_name}")
-
-        # Add the video clip to the list
-        video_clips.append(video_clip)
-
-        # Close clips to free memory
-        image_clip.close()
-        text_clip.close()
-        composite_clip.close()
-        audio_clip.close()
-        
-    # Check if we have clips before concatenating
-    if video_clips:
-        # Concatenate all video clips into one final video
-        final_video = concatenate_videoclips(video_clips)
-
-        # Export the final video to a file
-        #output_file = "output_movie.mp4"
-        final_video.write_videofile(
-            output_file, 
-            fps=24, 
-            codec="libx264", 
-            audio_codec="mp3",
-            audio=True
-            
-            )
-        final_video.close()  # Explicitly close the video object
+
+        segment_path = os.path.join(segments_dir, f"{scene_name}.mp4")
+        try:
+            image_clip.write_videofile(
+                segment_path,
+                fps=settings["fps"],
+                codec="libx264",
+                preset=settings["preset"],
+                threads=settings["threads"] or None,
+                audio=False,
+                ffmpeg_params=[
+                    "-crf", str(settings["crf"]), "-g", str(settings["fps"] * settings["keyframe_seconds"]),
+                    "-tune", "stillimage", "-pix_fmt", "yuv420p",
+                ],
+                logger=None
+                )
+        finally:
+            # Release the scene before loading the next one
+            image_clip.close()
+        segment_paths.append(segment_path)
+        pieces.append((scene_name, frames))
+
+    # Check if we have segments before joining them
+    if segment_paths:
+        concat_segments(segment_paths, output_file, audio.assemble(pieces), profile)
         print(f"Movie created successfully: {output_file}")
     else:
         print("No valid video clips created. Check your files.")
+
+
+def create_video(audio_dir="Audio", images_dir="images", output_file="output_movie.mp4",scenes_array=None, encoder=None, frames=None, pipeline=None, profile=None):
+    """
+    Build the final movie from the per-scene images and narration.
+
+    :param audio_dir: Directory with sceneN.mp3 or sceneN.wav files.
+    :param images_dir: Directory with sceneN.png files.
+    :param output_file: Path of the MP4 to write.
+    :param scenes_array: The parsed scenes, used for the scene summaries.
+    :param encoder: "ffmpeg" or "moviepy"; defaults to VIDEO_ENCODER.
+    :param frames: Optional dict of scene id to RGB numpy frame, used instead of the PNG files.
+    :param pipeline: Optional SegmentPipeline that is already encoding some of the scenes.
+    :param profile: Name of the render profile (see RENDER_PROFILES); defaults to RENDER_PROFILE.
+    """
+    scenes = _scene_inputs(audio_dir, images_dir, scenes_array, frames)
+    if not scenes:
+        print("No valid video clips created. Check your files.")
+        return
+
+    if (encoder or VIDEO_ENCODER) == "moviepy":
+        _create_video_moviepy(scenes, output_file, profile)
+    else:
+        _create_video_ffmpeg(scenes, output_file, pipeline, profile)
@@ -0,0 +1,295 @@
+from jobqueue import QueueFull
+import json
+import metrics
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sqlite3
+import sqlitedb
+import sys
+import threading
+import time
+import psutil
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id TEXT UNIQUE NOT NULL,
+    handler TEXT NOT NULL,
+    args TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    worker TEXT,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_state_id ON jobs (state, id);
+CREATE TABLE IF NOT EXISTS worker_metrics (
+    worker TEXT PRIMARY KEY,
+    snapshot TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+# Workers publish their metrics this often, for the API's /metrics to add in
+METRICS_PUSH_SECONDS = float(os.getenv("METRICS_PUSH_SECONDS", "10"))
+# worker_metrics row holding the combined totals of worker processes that have exited
+EXITED_WORKERS = "exited"
+
+
+def connect(db_path):
+    """Open the queue database, creating its tables if needed."""
+    conn = sqlitedb.connect(db_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class SqliteJobQueue:
+    """
+    Durable job queue backed by a local SQLite file.
+
+    Used by the API process when renders run in separate worker processes
+    (`python main.py --worker`). It has the same submit/position/depth/active/retry_after
+    surface as JobQueue, but instead of running func it stores func's name and
+    JSON-encoded args for a worker to pick up.
+
+    :param db_path: Path to the SQLite database shared with the workers.
+    :param max_size: Maximum number of jobs allowed to wait in the queue.
+    :param workers: Expected number of worker processes, used for Retry-After estimates.
+    """
+
+    def __init__(self, db_path, max_size=20, workers=2):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.workers = workers
+        # The schema is created once; every call after that reuses its thread's connection
+        connect(db_path).close()
+        self._connections = sqlitedb.ThreadConnections(db_path)
+
+    def submit(self, task_id, func, *args):
+        conn = self._connections.get()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            (queued,) = conn.execute("SELECT COUNT(*) FROM jobs WHERE state = 'queued'").fetchone()
+            if queued >= self.max_size:
+                raise QueueFull(self._retry_after(conn))
+            row = conn.execute("SELECT state FROM jobs WHERE task_id = ?", (task_id,)).fetchone()
+            if row is not None and row[0] in ("queued", "running"):
+                # Already waiting or being rendered
+                conn.execute("ROLLBACK")
+                return self.position(task_id)
+            # A task queued again (/retry, /render) replaces its finished job and joins the back of the queue
+            conn.execute("DELETE FROM jobs WHERE task_id = ?", (task_id,))
+            conn.execute(
+                "INSERT INTO jobs (task_id, handler, args, enqueued_at) VALUES (?, ?, ?, ?)",
+                (task_id, func.__name__, json.dumps(args), time.time()),
+            )
+            conn.execute("COMMIT")
+            return queued + 1
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def position(self, task_id):
+        conn = self._connections.get()
+        row = conn.execute("SELECT id, state FROM jobs WHERE task_id = ?", (task_id,)).fetchone()
+        if row is None:
+            return None
+        job_id, state = row
+        if state == "running":
+            return 0
+        if state != "queued":
+            return None
+        (ahead,) = conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE state = 'queued' AND id < ?", (job_id,)
+        ).fetchone()
+        return ahead + 1
+
+    def depth(self):
+        return self._count("queued")
+
+    def active(self):
+        return self._count("running")
+
+    def retry_after(self):
+        return self._retry_after(self._connections.get())
+
+    def _count(self, state):
+        (count,) = self._connections.get().execute("SELECT COUNT(*) FROM jobs WHERE state = ?", (state,)).fetchone()
+        return count
+
+    def worker_metrics(self):
+        """
+        The latest metrics snapshot of every running worker process, plus one for those that exited.
+
+        Exited workers are folded into that one snapshot by fold_exited_metrics, so their
+        counters keep counting in the totals without a row per worker ever started.
+        """
+        rows = self._connections.get().execute("SELECT snapshot FROM worker_metrics").fetchall()
+        return [json.loads(snapshot) for (snapshot,) in rows]
+
+    def _retry_after(self, conn):
+        (avg,) = conn.execute(
+            "SELECT AVG(finished_at - started_at) FROM "
+            "(SELECT finished_at, started_at FROM jobs WHERE state = 'done' ORDER BY id DESC LIMIT 20)"
+        ).fetchone()
+        return max(1, int((avg or 30.0) / max(1, self.workers)))
+
+
+def _claim(conn, worker, memory_budget=None):
+    conn.execute("BEGIN IMMEDIATE")
+    if memory_budget is not None:
+        # Checked under the write lock, so workers are admitted one at a time
+        host = worker.rpartition(":")[0]
+        (running,) = conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE state = 'running' AND worker LIKE ?", (host + ":%",)
+        ).fetchone()
+        if not memory_budget.admits(running):
+            conn.execute("ROLLBACK")
+            return None
+    row = conn.execute(
+        "SELECT id, task_id, handler, args FROM jobs WHERE state = 'queued' ORDER BY id LIMIT 1"
+    ).fetchone()
+    if row is not None:
+        conn.execute(
+            "UPDATE jobs SET state = 'running', worker = ?, started_at = ? WHERE id = ?",
+            (worker, time.time(), row[0]),
+        )
+    conn.execute("COMMIT")
+    return row
+
+
+def push_metrics(conn, worker):
+    """Store this worker process's metrics snapshot, replacing its previous one."""
+    conn.execute(
+        "INSERT OR REPLACE INTO worker_metrics (worker, snapshot, updated_at) VALUES (?, ?, ?)",
+        (worker, json.dumps(metrics.snapshot()), time.time()),
+    )
+
+
+def _push_metrics_forever(db_path, worker):
+    conn = connect(db_path)
+    while True:
+        try:
+            push_metrics(conn, worker)
+        except sqlite3.Error as e:
+            logger.warning(f"Worker {worker} could not publish its metrics: {e}")
+        time.sleep(METRICS_PUSH_SECONDS)
+
+
+def fold_exited_metrics(conn):
+    """Fold the metrics snapshots of worker processes on this host that no longer exist into one row."""
+    host = socket.gethostname()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        exited, snapshots = [], []
+        for worker, snapshot in conn.execute("SELECT worker, snapshot FROM worker_metrics").fetchall():
+            worker_host, _, pid = worker.rpartition(":")
+            if worker == EXITED_WORKERS or (worker_host == host and pid.isdigit() and not psutil.pid_exists(int(pid))):
+                exited.append(worker)
+                snapshots.append(json.loads(snapshot))
+        if len(exited) > 1 or (exited and exited[0] != EXITED_WORKERS):
+            conn.executemany("DELETE FROM worker_metrics WHERE worker = ?", [(worker,) for worker in exited])
+            conn.execute(
+                "INSERT INTO worker_metrics (worker, snapshot, updated_at) VALUES (?, ?, ?)",
+                (EXITED_WORKERS, json.dumps(metrics.combine(snapshots)), time.time()),
+            )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def requeue_orphans(db_path):
+    """
+    Put back jobs left 'running' by worker processes on this host that no longer exist,
+    and fold those processes' metrics into the exited workers' totals.
+    """
+    host = socket.gethostname()
+    conn = connect(db_path)
+    try:
+        requeued = 0
+        for job_id, worker in conn.execute("SELECT id, worker FROM jobs WHERE state = 'running'").fetchall():
+            worker_host, _, pid = (worker or "").rpartition(":")
+            if worker_host == host and pid.isdigit() and not psutil.pid_exists(int(pid)):
+                conn.execute(
+                    "UPDATE jobs SET state = 'queued', worker = NULL WHERE id = ? AND state = 'running'", (job_id,)
+                )
+                requeued += 1
+        if requeued:
+            logger.info(f"Requeued {requeued} jobs from dead workers")
+        fold_exited_metrics(conn)
+        return requeued
+    finally:
+        conn.close()
+
+
+def worker_loop(db_path, handlers, poll_interval=1.0, memory_budget=None):
+    """Claim and run jobs one at a time until the process is stopped."""
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    conn = connect(db_path)
+    threading.Thread(target=_push_metrics_forever, args=(db_path, worker), name="metrics-push", daemon=True).start()
+    logger.info(f"Render worker {worker} started")
+    while True:
+        job = _claim(conn, worker, memory_budget)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+
+        job_id, task_id, handler, args = job
+        logger.debug(f"Worker {worker} picked up task {task_id}")
+        try:
+            handlers[handler](*json.loads(args))
+            conn.execute("UPDATE jobs SET state = 'done', finished_at = ? WHERE id = ?", (time.time(), job_id))
+            push_metrics(conn, worker)
+        except Exception as e:
+            logger.error(f"Task {task_id} failed in worker {worker}: {e}")
+            conn.execute(
+                "UPDATE jobs SET state = 'failed', finished_at = ?, error = ? WHERE id = ?",
+                (time.time(), str(e), job_id),
+            )
+
+
+def run_workers(db_path, handlers, processes=2, memory_budget=None):
+    """
+    Start `processes` render worker processes and keep them running.
+
+    Each worker takes one job at a time from the queue, so renders use up to
+    `processes` cores without touching the API process. Workers that die are
+    replaced, and their jobs are put back in the queue.
+
+    :param db_path: Path to the SQLite queue database.
+    :param handlers: Maps handler names stored with each job to the functions that run them.
+    :param processes: Number of worker processes.
+    :param memory_budget: Optional MemoryBudget over this process tree; workers only take
+        a job when it fits.
+    """
+    requeue_orphans(db_path)
+    # Stop the workers on SIGTERM too, not just Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    pool = {}
+    try:
+        while True:
+            for slot in range(processes):
+                proc = pool.get(slot)
+                if proc is None or not proc.is_alive():
+                    if proc is not None:
+                        logger.warning(f"Render worker {proc.pid} exited with {proc.exitcode}, restarting")
+                        requeue_orphans(db_path)
+                    proc = multiprocessing.Process(
+                        target=worker_loop, args=(db_path, handlers), kwargs={"memory_budget": memory_budget}, daemon=True
+                    )
+                    proc.start()
+                    pool[slot] = proc
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for proc in pool.values():
+            proc.terminate()
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+
+class FileCache:
+    """
+    Content-addressed on-disk cache of generated files.
+
+    Entries are keyed by a hash of the parameters that produced them and stored as
+    <directory>/<key[:2]>/<key><suffix>. A hit is hardlinked (or copied, across
+    filesystems) to the destination and its mtime is bumped, so evicting the oldest
+    mtimes first gives LRU order. Once the cache grows past max_bytes the least
+    recently used entries are removed.
+
+    :param directory: Where cache entries are stored.
+    :param max_bytes: Size limit of the cache; 0 disables caching.
+    :param suffix: File extension of the cached files, e.g. ".png".
+    :param name: Names the cache in the text2clip_cache_lookups_total metric.
+    """
+
+    def __init__(self, directory, max_bytes, suffix="", name=None):
+        self.directory = directory
+        self.name = name or os.path.basename(directory)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        self._size = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    @staticmethod
+    def make_key(**params):
+        """Hash the generation parameters into a stable cache key."""
+        payload = json.dumps(params, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + self.suffix)
+
+    def stats(self):
+        """Hit/miss counters for this process."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        CACHE_LOOKUPS.inc(cache=self.name, result="hits" if hit else "misses")
+        return hit
+
+    def fetch(self, key, dest):
+        """Place the cached file for key at dest. Returns False on a miss."""
+        if not self.enabled:
+            return False
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return self._count(False)
+        if os.path.exists(dest):
+            os.remove(dest)
+        try:
+            os.link(path, dest)
+        except FileNotFoundError:
+            # Evicted between the utime and the link
+            return self._count(False)
+        except OSError:
+            shutil.copyfile(path, dest)
+        return self._count(True)
+
+    def read(self, key):
+        """Return the cached bytes for key, or None on a miss."""
+        if not self.enabled:
+            return None
+        path = self.path(key)
+        try:
+            os.utime(path)
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            self._count(False)
+            return None
+        self._count(True)
+        return data
+
+    def store(self, key, src):
+        """Copy src into the cache under key, then evict if the cache is over its limit."""
+        if not self.enabled or not os.path.exists(src):
+            return
+        self._write(key, lambda tmp_path: shutil.copyfile(src, tmp_path))
+
+    def store_bytes(self, key, data):
+        """Store data in the cache under key, then evict if the cache is over its limit."""
+        if not self.enabled:
+            return
+
+        def write(tmp_path):
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+
+        self._write(key, write)
+
+    def _write(self, key, write):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file next to the entry and rename, so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        os.close(fd)
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += os.path.getsize(path)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield st.st_mtime, st.st_size, path
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        # Rescan rather than trusting the running total, other processes may share the cache
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        logger.debug(f"Evicted cache entries in {self.directory}, {total} bytes left")
+        self._size = total
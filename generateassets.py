@@ -0,0 +1,181 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from dotenv import load_dotenv
+from generateimage import generate_image, image_cache, load_frame
+from text2speech import text2speech, tts_backend
+import logging
+import os
+import queue
+import threading
+import time
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Per-provider concurrency limits. The semaphores are module level so the limits
+# hold across every job running in this process, not just within one job.
+IMAGE_CONCURRENCY = int(os.getenv("IMAGE_CONCURRENCY", "4"))
+TTS_CONCURRENCY = int(os.getenv("TTS_CONCURRENCY", "4"))
+ASSET_RETRIES = int(os.getenv("ASSET_RETRIES", "2"))
+ASSET_RETRY_DELAY = float(os.getenv("ASSET_RETRY_DELAY", "1.0"))
+# Images are kept in memory and handed to the encoder as frames; set KEEP_ARTIFACTS=1
+# to also write them to the task's images/ dir for debugging. Without an image cache
+# to resume from they are always written, as the task's checkpoint.
+KEEP_ARTIFACTS = os.getenv("KEEP_ARTIFACTS", "0").lower() in ("1", "true", "yes")
+
+_provider_slots = {
+    "image": threading.BoundedSemaphore(IMAGE_CONCURRENCY),
+    "audio": threading.BoundedSemaphore(TTS_CONCURRENCY),
+}
+
+
+class AssetGenerationError(Exception):
+    """Raised when some scene assets still fail after all retries.
+
+    ``errors`` maps scene ids to ``{kind: message}`` for every asset that failed.
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        failed = ", ".join(f"{scene_id} {kind}" for scene_id, kinds in errors.items() for kind in kinds)
+        super().__init__(f"Asset generation failed for {failed}")
+
+
+def _generate_one(kind, scene, scene_id, images_dir, audio_dir, delay=0):
+    # Retries wait before taking a provider slot, so they do not hold one while idle
+    if delay:
+        time.sleep(delay)
+    with _provider_slots[kind]:
+        if kind == "image":
+            keep_file = KEEP_ARTIFACTS or not image_cache.enabled
+            frame = generate_image(scene.get("image_prompt", ""), scene_id, output_dir=images_dir, keep_file=keep_file)
+            if frame is None:
+                raise RuntimeError(f"No image returned for {scene_id}")
+            return frame
+        path = text2speech(scene.get("text", ""), scene_id, output_dir=audio_dir)
+    if not path or not os.path.exists(path):
+        raise RuntimeError(f"audio for {scene_id} was not written to {path}")
+    return path
+
+
+def _load_checkpoint(kind, scene_id, images_dir, audio_dir):
+    """Return a previously generated asset from the task dirs, or None if it has to be redone."""
+    if kind == "image":
+        path = os.path.join(images_dir, scene_id + ".png")
+        try:
+            return load_frame(path) if os.path.exists(path) else None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable checkpoint {path}: {e}")
+            return None
+    path = os.path.join(audio_dir, scene_id + tts_backend.suffix)
+    return path if os.path.exists(path) else None
+
+
+def generate_assets(scenes, images_dir="images", audio_dir="Audio", on_progress=None, on_scene_ready=None, completed=None):
+    """
+    Generate the image and narration for every scene concurrently.
+
+    Each scene's image and audio are separate jobs on a thread pool, throttled by the
+    per-provider limits above. `scenes` may be a generator that yields scenes as they
+    are planned: the jobs for a scene start as soon as it arrives. A failed job is
+    retried on its own after a short delay, so one flaky request does not restart the
+    whole job.
+
+    :param scenes: The scenes (a list or an iterable), each with "image_prompt" and "text".
+    :param images_dir: Where to write sceneN.png files when KEEP_ARTIFACTS is set.
+    :param audio_dir: Where to write the sceneN narration files (.mp3 or .wav, per TTS engine).
+    :param on_progress: Optional callback(scene_id, kind) called as each asset completes.
+    :param on_scene_ready: Optional callback(scene_id, frame, audio_path) called as soon as
+        both assets of a scene exist, e.g. to start encoding it.
+    :param completed: Optional map of scene id to the asset kinds generated by an earlier
+        attempt. Those are read back from images_dir/audio_dir instead of regenerated;
+        an image that was only kept in the image cache is served from there.
+    :return: A dict mapping scene ids to their decoded RGB image frames.
+    :raises AssetGenerationError: If any asset still fails after ASSET_RETRIES retries.
+    """
+    os.makedirs(images_dir, exist_ok=True)
+    os.makedirs(audio_dir, exist_ok=True)
+
+    scenes_array = []
+    frames = {}
+    audio_paths = {}
+    attempts = {}
+    errors = {}
+    # The scene feeder and finished jobs report here; only this thread handles results
+    events = queue.Queue()
+    workers = max(1, IMAGE_CONCURRENCY + TTS_CONCURRENCY)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="assets") as pool:
+        def submit(kind, index, delay=0):
+            future = pool.submit(_generate_one, kind, scenes_array[index], f"scene{index}", images_dir, audio_dir, delay)
+            future.add_done_callback(lambda f: events.put(("done", kind, index, f)))
+
+        def feed():
+            try:
+                for scene in scenes:
+                    scenes_array.append(scene)
+                    index = len(scenes_array) - 1
+                    events.put(("scene", index))
+                    for kind in ("image", "audio"):
+                        checkpoint = None
+                        if kind in (completed or {}).get(f"scene{index}", ()):
+                            checkpoint = _load_checkpoint(kind, f"scene{index}", images_dir, audio_dir)
+                        if checkpoint is None:
+                            submit(kind, index)
+                            continue
+                        future = Future()
+                        future.set_result(checkpoint)
+                        events.put(("done", kind, index, future))
+            except Exception as e:
+                events.put(("end", e))
+            else:
+                events.put(("end", None))
+
+        threading.Thread(target=feed, name="assets-feed", daemon=True).start()
+        feeding = True
+        outstanding = 0
+        try:
+            while feeding or outstanding:
+                event = events.get()
+                if event[0] == "scene":
+                    outstanding += 2
+                    continue
+                if event[0] == "end":
+                    feeding = False
+                    if event[1] is not None:
+                        raise event[1]
+                    continue
+
+                _, kind, index, future = event
+                outstanding -= 1
+                scene_id = f"scene{index}"
+                try:
+                    result = future.result()
+                except Exception as e:
+                    attempt = attempts.get((kind, index), 0) + 1
+                    attempts[(kind, index)] = attempt
+                    if attempt > ASSET_RETRIES:
+                        logger.error(f"Failed to generate {kind} for {scene_id}: {e}")
+                        errors.setdefault(scene_id, {})[kind] = str(e)
+                        continue
+                    logger.warning(f"Failed to generate {kind} for {scene_id}: {e}; retrying (attempt {attempt + 1})")
+                    outstanding += 1
+                    submit(kind, index, delay=ASSET_RETRY_DELAY * attempt)
+                    continue
+
+                if kind == "image":
+                    frames[scene_id] = result
+                else:
+                    audio_paths[scene_id] = result
+                if on_progress is not None:
+                    on_progress(scene_id, kind)
+                if on_scene_ready is not None and scene_id in frames and scene_id in audio_paths:
+                    on_scene_ready(scene_id, frames[scene_id], audio_paths[scene_id])
+        except BaseException:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    if errors:
+        raise AssetGenerationError(errors)
+    return frames
@@ -1,7 +1,14 @@
 from together import Together
 from dotenv import load_dotenv
+from filecache import FileCache
+from singleflight import SingleFlight
+from metrics import PROVIDER_SECONDS, BYTES_WRITTEN
+from PIL import Image
+import base64
+import io
 import os
-import requests
+import numpy as np
+import providers
 
 
 
@@ -11,46 +18,92 @@ load_dotenv()
 
 # Set your API key securely
 TOGETHER_API_KEY = os.getenv("TOGETHER_API_KEY")
-client = Together(api_key=TOGETHER_API_KEY)
-
-
-def generate_image(prompt, output_filename,output_dir="images"):
-    
-    os.makedirs(output_dir, exist_ok=True)
-
-    response = client.images.generate(
-        prompt=prompt,
-        model="black-forest-labs/FLUX.1-schnell-Free",
-        steps=3,
-        n=1,
-        height=1024,
-        width=1024,
-        seed=131346467979,
-        guidance_scale=6,
-        
-
-    )
-    image_url=(response.data[0].url)  # Print the base64-encoded image data
-    # Ensure the 'images' directory exists
-    images_dir = output_dir
-
-    # Save image
+# Each attempt times out after PROVIDER_TIMEOUT; providers.call does the retrying, so the SDK's own is off
+client = Together(api_key=TOGETHER_API_KEY, timeout=providers.PROVIDER_TIMEOUT, max_retries=0)
+
+# The request below is fully deterministic (fixed seed, steps and size), so identical
+# prompts always give identical images and can be served from the cache.
+IMAGE_PARAMS = {
+    "model": "black-forest-labs/FLUX.1-schnell-Free",
+    "steps": 3,
+    "n": 1,
+    "height": 1024,
+    "width": 1024,
+    "seed": 131346467979,
+    "guidance_scale": 6,
+}
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", os.path.join("cache", "images"))
+IMAGE_CACHE_MAX_MB = int(os.getenv("IMAGE_CACHE_MAX_MB", "1024"))
+image_cache = FileCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_MB * 1024 * 1024, suffix=".png", name="image")
+_image_flight = SingleFlight()
+
+def _decode_png(data):
+    """Decode image bytes into an RGB numpy frame."""
+    with Image.open(io.BytesIO(data)) as image:
+        return np.asarray(image.convert("RGB"))
+
+
+def load_frame(path):
+    """Read a saved PNG back as an RGB numpy frame."""
+    with open(path, "rb") as f:
+        return _decode_png(f.read())
+
+
+def _fetch_image(prompt, cache_key, output_filename):
+    """Return the PNG bytes for a prompt, from the cache or from Together."""
+    data = image_cache.read(cache_key)
+    if data is not None:
+        print(f"Image for {output_filename} served from cache")
+        return data
+
+    with PROVIDER_SECONDS.time(provider="together"):
+        response = providers.call(
+            "api.together.xyz", client.images.generate,
+            prompt=prompt, response_format="base64", **IMAGE_PARAMS
+        )
     try:
-        image_url = response.data[0].url  # Get the image URL from the response
-        #print(f"Downloading image from: {image_url}")  # Debugging: Print the URL
-
-        # Download the image from the URL
-        response_image = requests.get(image_url)
-        
-        # Check if the download was successful
-        if response_image.status_code == 200:
-            filename = os.path.join(images_dir, output_filename+".png")
-            with open(filename, "wb") as f:
-                f.write(response_image.content)  # Write the binary content of the image
-            print(f"Image saved to {filename}")
-        else:
-            print(f"Failed to download image. Status code: {response_image.status_code}")
-    except AttributeError:
+        image_data = response.data[0]
+    except (AttributeError, IndexError):
         print("Error: Response structure might have changed. Check the API response format.")
         print("Full response:", response)
+        raise
+
+    if getattr(image_data, "b64_json", None):
+        data = base64.b64decode(image_data.b64_json)
+    else:
+        # Provider ignored response_format, fall back to fetching the URL
+        with PROVIDER_SECONDS.time(provider="image_download"):
+            data = providers.fetch_bytes(image_data.url)
+    image_cache.store_bytes(cache_key, data)
+    return data
+
+
+def generate_image(prompt, output_filename,output_dir="images", keep_file=True):
+    """
+    Generate the image for a prompt and return it as an RGB numpy frame.
+
+    The image is requested as base64 and decoded in memory, so the frame can go
+    straight to the encoder. It is written to output_dir only when keep_file is set.
+
+    :param prompt: The image prompt.
+    :param output_filename: File name (without extension) used when keeping the file.
+    :param output_dir: Where to write the PNG when keep_file is set.
+    :param keep_file: Also save the PNG as output_dir/output_filename.png.
+    """
+    filename = os.path.join(output_dir, output_filename+".png")
+
+    cache_key = image_cache.make_key(prompt=prompt, **IMAGE_PARAMS)
+    # Identical prompts requested at the same time (e.g. across a batch) share one API call
+    data = _image_flight.do(cache_key, _fetch_image, prompt, cache_key, output_filename)
+
+    frame = _decode_png(data)
 
+    if keep_file:
+        os.makedirs(output_dir, exist_ok=True)
+        # Write beside the target and rename, so a reader never sees a half-written image
+        with open(filename + ".part", "wb") as f:
+            f.write(data)
+        os.replace(filename + ".part", filename)
+        BYTES_WRITTEN.inc(len(data), kind="image")
+        print(f"Image saved to {filename}")
+    return frame
@@ -0,0 +1,111 @@
+from collections import deque
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when the queue is at capacity."""
+
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f"Job queue is full, retry after {retry_after}s")
+
+
+class JobQueue:
+    """
+    Bounded in-process job queue served by a fixed pool of worker threads.
+
+    Jobs wait in FIFO order until one of the workers is free, so at most `workers`
+    renders run at once no matter how many requests arrive. Once `max_size` jobs
+    are waiting, submit() refuses new work instead of queueing it.
+
+    With a `memory_budget`, a free worker also waits until the next job fits in the
+    budget before taking it, so fewer renders run at once while memory is tight.
+
+    :param workers: Number of worker threads running jobs.
+    :param max_size: Maximum number of jobs allowed to wait in the queue.
+    :param memory_budget: Optional MemoryBudget consulted before each job starts.
+    """
+
+    def __init__(self, workers=2, max_size=20, name="render", memory_budget=None):
+        self.workers = workers
+        self.max_size = max_size
+        self.name = name
+        self.memory_budget = memory_budget
+        self._pending = deque()
+        self._active = set()
+        self._cond = threading.Condition()
+        # One worker at a time checks the budget and takes a job, so two cannot both fit in the same room
+        self._admit_lock = threading.Lock()
+        # Rolling average job duration, used to estimate Retry-After
+        self._avg_duration = None
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"{name}-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, task_id, func, *args, **kwargs):
+        """Queue func(*args, **kwargs) under task_id and return its 1-based queue position."""
+        with self._cond:
+            if len(self._pending) >= self.max_size:
+                raise QueueFull(self._retry_after_locked())
+            self._pending.append((task_id, func, args, kwargs))
+            self._cond.notify()
+            return len(self._pending)
+
+    def position(self, task_id):
+        """Return the 1-based position of a waiting task, 0 if it is running, or None."""
+        with self._cond:
+            if task_id in self._active:
+                return 0
+            for index, (pending_id, _, _, _) in enumerate(self._pending):
+                if pending_id == task_id:
+                    return index + 1
+        return None
+
+    def depth(self):
+        with self._cond:
+            return len(self._pending)
+
+    def active(self):
+        with self._cond:
+            return len(self._active)
+
+    def retry_after(self):
+        with self._cond:
+            return self._retry_after_locked()
+
+    def _retry_after_locked(self):
+        # Time until a queue slot frees up: one job's worth of work spread over the workers
+        avg = self._avg_duration if self._avg_duration is not None else 30.0
+        return max(1, int(avg / max(1, self.workers)))
+
+    def _worker(self):
+        while True:
+            with self._admit_lock:
+                with self._cond:
+                    while not self._pending:
+                        self._cond.wait()
+                if self.memory_budget is not None:
+                    self.memory_budget.wait(self.active)
+                with self._cond:
+                    task_id, func, args, kwargs = self._pending.popleft()
+                    self._active.add(task_id)
+
+            started = time.time()
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Job {task_id} raised: {e}")
+            finally:
+                duration = time.time() - started
+                with self._cond:
+                    self._active.discard(task_id)
+                    if self._avg_duration is None:
+                        self._avg_duration = duration
+                    else:
+                        self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
@@ -1,10 +1,21 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS  # Import CORS
 from flasgger import Swagger, swag_from  # Import Flasgger for Swagger
-from text2speech import text2speech
-from scenecreator import createscenes as create_scenes
-from generateimage import generate_image
-from createvideo import create_video
+from werkzeug.serving import is_running_from_reloader
+from scenecreator import plan_scenes, stream_scenes
+from generateassets import generate_assets
+from createvideo import create_video, segment_pipeline, RENDER_PROFILES, RENDER_PROFILE
+from jobqueue import JobQueue, QueueFull
+from durablequeue import SqliteJobQueue, run_workers
+from generateimage import image_cache
+from text2speech import audio_cache
+from taskstore import TaskStore
+from memorybudget import MemoryBudget
+from manifest import TaskManifest
+from metrics import STAGE_SECONDS, JOBS_TOTAL, ACTIVE_JOBS, BYTES_WRITTEN, Gauge
+import metrics
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
 import json
 import os
 import shutil
@@ -12,7 +23,7 @@ import uuid
 import threading
 import time
 import logging
-import io
+import zipfile
 from dotenv import load_dotenv
 import psutil
 
@@ -39,6 +50,54 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Renders run on a fixed pool of workers; once JOB_QUEUE_SIZE jobs are waiting, new ones get a 429.
+# JOB_BACKEND=thread renders inside this process; JOB_BACKEND=sqlite only queues jobs in JOB_DB_PATH
+# and leaves the rendering to separate `python main.py --worker` processes.
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "20"))
+JOB_BACKEND = os.getenv("JOB_BACKEND", "thread")
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(BASE_TEMP_DIR, "jobs.db"))
+# With RENDER_RSS_BUDGET_MB set, a render only starts when it fits in that much RSS across the
+# rendering processes; RENDER_JOB_RSS_MB is the footprint assumed for a render until one is measured
+RENDER_RSS_BUDGET_MB = int(os.getenv("RENDER_RSS_BUDGET_MB", "0"))
+RENDER_JOB_RSS_MB = int(os.getenv("RENDER_JOB_RSS_MB", "300"))
+if JOB_BACKEND == "sqlite":
+    job_queue = SqliteJobQueue(JOB_DB_PATH, max_size=JOB_QUEUE_SIZE, workers=RENDER_WORKERS)
+else:
+    job_queue = JobQueue(workers=RENDER_WORKERS, max_size=JOB_QUEUE_SIZE,
+                         memory_budget=MemoryBudget(RENDER_RSS_BUDGET_MB, RENDER_JOB_RSS_MB))
+
+# With "preview": true a task first renders a quick preview.mp4 with PREVIEW_PROFILE, then the full render
+PREVIEW_PROFILE = os.getenv("PREVIEW_PROFILE", "draft")
+
+Gauge("text2clip_queue_depth", "Jobs waiting in the render queue.", callback=lambda: job_queue.depth())
+Gauge("text2clip_queue_active", "Jobs currently taken by render workers.", callback=lambda: job_queue.active())
+Gauge("text2clip_process_rss_bytes", "Resident memory of this process and its children (ffmpeg).",
+      callback=lambda: MemoryBudget(0).tree_rss())
+Gauge(
+    "text2clip_cache_hit_ratio", "Cache hit ratio in this process.", labelnames=("cache",),
+    callback=lambda: {("image",): image_cache.stats()["hit_rate"], ("audio",): audio_cache.stats()["hit_rate"]},
+)
+
+# Batches plan scenes BATCH_PLAN_CONCURRENCY at a time and keep at most BATCH_MAX_QUEUED jobs waiting
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+BATCH_PLAN_CONCURRENCY = int(os.getenv("BATCH_PLAN_CONCURRENCY", "4"))
+BATCH_MAX_QUEUED = int(os.getenv("BATCH_MAX_QUEUED", str(max(1, JOB_QUEUE_SIZE // 2))))
+
+# Task status lives in TASK_DB_PATH, shared with the render workers; SSE streams send a keep-alive
+# comment when idle this long
+TASK_DB_PATH = os.getenv("TASK_DB_PATH", os.path.join(BASE_TEMP_DIR, "tasks.db"))
+SSE_KEEPALIVE_SECONDS = int(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+TASK_STATES = ("PROGRESS", "PREVIEW", "SUCCESS", "FAILURE")
+TASK_SUMMARY_FIELDS = ("state", "status", "progress", "batch_id", "error", "output_bytes", "preview_bytes",
+                       "created_at", "updated_at", "started_at", "finished_at", "purged_at")
+TASKS_PAGE_MAX = 1000
+
+# Downloaded tasks are kept this long after the last download completes, so players can seek and resume
+DOWNLOAD_RETENTION_SECONDS = int(os.getenv("DOWNLOAD_RETENTION_SECONDS", "600"))
+_cleanup_timers = {}
+_cleanup_lock = threading.Lock()
+
 def safe_rmtree(path, retries=3, delay=0.5):
     for attempt in range(retries):
         try:
@@ -61,73 +120,246 @@ def safe_rmtree(path, retries=3, delay=0.5):
                 return False
     return True
 
+def schedule_cleanup(task_dir):
+    """Delete task_dir DOWNLOAD_RETENTION_SECONDS after its last download finished."""
+    with _cleanup_lock:
+        timer = _cleanup_timers.pop(task_dir, None)
+        if timer is not None:
+            timer.cancel()
+        timer = threading.Timer(DOWNLOAD_RETENTION_SECONDS, _run_cleanup, args=(task_dir,))
+        timer.daemon = True
+        _cleanup_timers[task_dir] = timer
+        timer.start()
+
+def _run_cleanup(task_dir):
+    with _cleanup_lock:
+        _cleanup_timers.pop(task_dir, None)
+    if os.path.exists(task_dir) and not safe_rmtree(task_dir):
+        logger.info(f"Deferred cleanup for {task_dir}")
+    else:
+        task_store.purge(os.path.basename(task_dir))
+
 def cleanup_old_temp_dirs(max_age_hours=24):
-    now = time.time()
+    """
+    Delete the directories of tasks created more than max_age_hours ago, and of their batches.
+
+    The tasks come from the task store's index on creation time, so this never lists the
+    temp directory; their status stays in the store, marked purged.
+    """
     deleted = 0
-    for folder in os.listdir(BASE_TEMP_DIR):
-        path = os.path.join(BASE_TEMP_DIR, folder)
-        if os.path.isdir(path):
-            creation_time = os.path.getctime(path)
-            age_hours = (now - creation_time) / 3600
-            if age_hours > max_age_hours:
+    for task_id, batch_id in task_store.expired(time.time() - max_age_hours * 3600):
+        for path in (os.path.join(BASE_TEMP_DIR, task_id), batch_id and batch_dir(batch_id)):
+            if path and os.path.isdir(path):
                 logger.debug(f"Cleaning up old directory: {path}")
                 if safe_rmtree(path):
                     deleted += 1
+        if not os.path.exists(os.path.join(BASE_TEMP_DIR, task_id)):
+            task_store.purge(task_id)
     return deleted
 
-def update_status(task_dir, status, output_file=None):
-    status_file = os.path.join(task_dir, "status.json")
-    data = {"status": status}
+def import_status_files():
+    """Load the status.json files written before the task store into it, on its first start."""
+    if task_store.count():
+        return 0
+    imported = 0
+    for task_id in os.listdir(BASE_TEMP_DIR):
+        status_file = os.path.join(BASE_TEMP_DIR, task_id, "status.json")
+        try:
+            with open(status_file) as f:
+                status_data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        task_store.update(task_id, created_at=os.path.getctime(os.path.dirname(status_file)), **status_data)
+        os.remove(status_file)
+        imported += 1
+    if imported:
+        logger.info(f"Imported the status of {imported} tasks into {TASK_DB_PATH}")
+    return imported
+
+def update_status(task_dir, status=None, output_file=None, **fields):
+    """Record a task's status (and any extra fields such as progress) and notify listeners."""
+    if status is not None:
+        fields["status"] = status
     if output_file:
-        data["output_file"] = output_file
-    with open(status_file, 'w') as f:
-        json.dump(data, f)
+        fields["output_file"] = output_file
+    for name in ("output", "preview"):
+        if fields.get(f"{name}_file") and os.path.exists(fields[f"{name}_file"]):
+            fields[f"{name}_bytes"] = os.path.getsize(fields[f"{name}_file"])
+    task_store.update(os.path.basename(task_dir), **fields)
+
+def get_status(task_id):
+    """Return (version, status dict) for a task from the task store, or (0, None)."""
+    return task_store.get(task_id)
+
+def task_state(status):
+    if status.startswith("Error"):
+        return "FAILURE"
+    if status == "Done":
+        return "SUCCESS"
+    if status == "Preview ready":
+        return "PREVIEW"
+    return "PROGRESS"
+
+task_store = TaskStore(TASK_DB_PATH, task_state)
+
+def task_summary(task_id, status_data):
+    """A task's entry in /tasks: its status, timings, output sizes and error, without scene details."""
+    summary = {"task_id": task_id}
+    for field in TASK_SUMMARY_FIELDS:
+        if field in status_data:
+            summary[field] = status_data[field]
+    return summary
+
+def progress_response(task_id, status_data):
+    state = task_state(status_data["status"])
+    response = {"state": state, "status": status_data["status"]}
+    for field in ("progress", "scene_progress"):
+        if field in status_data:
+            response[field] = status_data[field]
+    if status_data["status"] == "Queued":
+        position = job_queue.position(task_id)
+        if position:
+            response["queue_position"] = position
+    if state == "SUCCESS" and "purged_at" not in status_data:
+        response["download_url"] = f"/download/{task_id}"
+    if "preview_file" in status_data and "purged_at" not in status_data:
+        response["preview_url"] = f"/download/{task_id}?variant=preview"
+    return response
+
+def planned_scenes(topic, num_scenes, scenes_array, manifest):
+    """Yield a topic's scenes as the LLM streams them, collecting them into scenes_array."""
+    started = time.perf_counter()
+    for scene in stream_scenes(topic, num_scenes):
+        scenes_array.append(scene)
+        yield scene
+    STAGE_SECONDS.observe(time.perf_counter() - started, stage="scenes")
+    if scenes_array:
+        manifest.update(scenes=scenes_array)
+    logger.debug(f"Memory usage after scene generation: {get_memory_usage()}")
 
-def generate_video_async(task_id, topic, num_scenes):
+def generate_video_async(task_id, topic, num_scenes, scenes_array=None):
+    """
+    Render one task, overlapping its stages.
+
+    Scenes are streamed from the LLM, each scene's image and narration are requested
+    as soon as the scene arrives, and its video segment starts encoding as soon as
+    both exist. What is left after the last asset is finishing the last segments and
+    joining them, so the job takes about as long as its slowest stage rather than the
+    sum of all of them.
+
+    Progress is checkpointed in the task's manifest: the scene plan and every finished
+    asset. Running the task again (a retry, or a restart after a crash) skips those
+    and only generates what is missing.
+    """
     task_dir = os.path.join(BASE_TEMP_DIR, task_id)
     audio_dir = os.path.join(task_dir, "Audio")
     images_dir = os.path.join(task_dir, "images")
+    output_file = os.path.join(task_dir, "output_movie.mp4")
     os.makedirs(audio_dir, exist_ok=True)
     os.makedirs(images_dir, exist_ok=True)
     logger.debug(f"Task {task_id} started in {task_dir}")
     logger.debug(f"Initial memory usage: {get_memory_usage()}")
 
+    ACTIVE_JOBS.inc()
+    started = time.perf_counter()
+    result = "failure"
+    pipeline = None
     try:
-        update_status(task_dir, "Generating scenes")
-        scenes = create_scenes(topic, num_scenes)
-        logger.debug(f"Memory usage after scene generation: {get_memory_usage()}")
+        manifest = TaskManifest(task_dir)
+        if "topic" not in manifest.data:
+            manifest.update(topic=topic, num_scenes=num_scenes)
+        if scenes_array is None:
+            scenes_array = manifest.scenes
+        elif manifest.scenes is None:
+            manifest.update(scenes=scenes_array)
+        profile = manifest.data.get("profile")
+        preview_file = os.path.join(task_dir, "preview.mp4")
+        make_preview = manifest.data.get("preview", False) and not os.path.exists(preview_file)
+        full_render = manifest.data.get("full_render", True)
+        completed = manifest.completed_assets()
+        if completed:
+            logger.info(f"Task {task_id} resuming with {sum(map(len, completed.values()))} assets already generated")
+
+        if scenes_array is None:
+            update_status(task_dir, "Generating scenes", progress=0)
+            scenes_array = []
+            scenes = planned_scenes(topic, num_scenes, scenes_array, manifest)
+        else:
+            update_status(task_dir, "Processing scenes", progress=10)
+            scenes = scenes_array
+
+        # Each scene is half done once its image or audio exists; assets cover 10-80% overall
+        scene_progress = {f"scene{index}": 0 for index in range(len(scenes_array) or num_scenes)}
+        progress_lock = threading.Lock()
+
+        def on_asset_done(scene_id, kind):
+            manifest.mark_asset(scene_id, kind)
+            with progress_lock:
+                scene_progress[scene_id] = scene_progress.get(scene_id, 0) + 50
+                done = sum(scene_progress.values()) / (100 * len(scene_progress))
+                update_status(task_dir, "Processing scenes", progress=10 + int(70 * done), scene_progress=dict(scene_progress))
+
+        def on_scene_ready(scene_id, frame, audio_path):
+            summary = scenes_array[int(scene_id[len("scene"):])].get("summary", "")
+            pipeline.add(scene_id, frame, audio_path, caption=summary)
 
-        scenes = scenes.strip("```json\n").strip()
-        scenes_data = json.loads(scenes)
-        scenes_array = scenes_data.get("scenes", [])
+        # Segments start encoding as scenes become ready: for the preview first, if there is one
+        if make_preview:
+            pipeline = segment_pipeline(preview_file, len(scene_progress), profile=PREVIEW_PROFILE)
+        else:
+            pipeline = segment_pipeline(output_file, len(scene_progress), profile=profile)
+        with STAGE_SECONDS.time(stage="assets"):
+            frames = generate_assets(scenes, images_dir=images_dir, audio_dir=audio_dir,
+                                     on_progress=on_asset_done,
+                                     on_scene_ready=on_scene_ready if pipeline else None,
+                                     completed=completed)
+        logger.debug(f"Memory usage after generating assets: {get_memory_usage()}")
         if not scenes_array:
             update_status(task_dir, "Error: No scenes generated")
             return
 
-        update_status(task_dir, "Processing scenes")
-        for index, scene in enumerate(scenes_array):
-            image_prompt = scene.get("image_prompt", "")
-            text = scene.get("text", "")
-            scene_id = f"scene{index}"
-            generate_image(image_prompt, scene_id, output_dir=images_dir)
-            logger.debug(f"Memory usage after generating image {scene_id}: {get_memory_usage()}")
-            text2speech(text, scene_id, output_dir=audio_dir)
-            logger.debug(f"Memory usage after generating audio {scene_id}: {get_memory_usage()}")
-
-        update_status(task_dir, "Creating video")
-        output_file = os.path.join(task_dir, "output_movie.mp4")
-        create_video(audio_dir=audio_dir, images_dir=images_dir, output_file=output_file, scenes_array=scenes_array)
+        if make_preview:
+            update_status(task_dir, "Creating preview", progress=80)
+            with STAGE_SECONDS.time(stage="preview"):
+                create_video(audio_dir=audio_dir, images_dir=images_dir, output_file=preview_file,
+                             scenes_array=scenes_array, frames=frames, pipeline=pipeline, profile=PREVIEW_PROFILE)
+            if pipeline is not None:
+                pipeline.close()
+                pipeline = None
+            if not os.path.exists(preview_file):
+                update_status(task_dir, "Error: Preview creation failed")
+                return
+            update_status(task_dir, preview_file=preview_file)
+        if not full_render:
+            update_status(task_dir, "Preview ready", progress=100)
+            result = "success"
+            return
+
+        update_status(task_dir, "Creating video", progress=85 if manifest.data.get("preview") else 80)
+        if pipeline is None:
+            pipeline = segment_pipeline(output_file, len(scenes_array), profile=profile)
+        with STAGE_SECONDS.time(stage="encode"):
+            create_video(audio_dir=audio_dir, images_dir=images_dir, output_file=output_file,
+                         scenes_array=scenes_array, frames=frames, pipeline=pipeline, profile=profile)
         logger.debug(f"Memory usage after video creation: {get_memory_usage()}")
 
         if not os.path.exists(output_file):
             update_status(task_dir, "Error: Video creation failed")
             return
 
-        update_status(task_dir, "Done", output_file=output_file)
+        BYTES_WRITTEN.inc(os.path.getsize(output_file), kind="video")
+        update_status(task_dir, "Done", output_file=output_file, progress=100)
+        result = "success"
 
     except Exception as e:
         update_status(task_dir, f"Error: {str(e)}")
         logger.error(f"Task {task_id} failed: {e}")
+    finally:
+        if pipeline is not None:
+            pipeline.close()
+        ACTIVE_JOBS.dec()
+        JOBS_TOTAL.inc(result=result)
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="total")
 
 def get_memory_usage():
     """Returns the memory usage of the current process in MB."""
@@ -139,6 +371,166 @@ def get_memory_usage():
         "percent": psutil.virtual_memory().percent  # System-wide memory usage percentage
     }
 
+def resume_task(task_id):
+    """
+    Queue an existing task again from its manifest; it resumes from its last checkpoint.
+
+    If the job cannot be queued, the task keeps the status it had before.
+
+    :raises QueueFull: If the render queue has no room.
+    """
+    task_dir = os.path.join(BASE_TEMP_DIR, task_id)
+    manifest = TaskManifest(task_dir)
+    _, previous = get_status(task_id)
+    update_status(task_dir, "Queued", progress=0)
+    try:
+        return job_queue.submit(task_id, generate_video_async, task_id, manifest.data["topic"], manifest.data["num_scenes"])
+    except Exception:
+        if previous is not None:
+            update_status(task_dir, previous["status"], progress=previous.get("progress"))
+        raise
+
+def resume_interrupted_tasks():
+    """
+    Queue again the tasks that were queued or running when this process last stopped.
+
+    Only needed with the in-process thread queue, which loses its jobs on a restart;
+    the sqlite queue keeps them and requeues jobs of dead workers by itself.
+    """
+    resumed = 0
+    interrupted = [task_id for task_id, _ in task_store.list(state="PROGRESS", limit=None)]
+    for task_id in interrupted:
+        task_dir = os.path.join(BASE_TEMP_DIR, task_id)
+        if not TaskManifest.exists(task_dir):
+            continue
+        try:
+            resume_task(task_id)
+            resumed += 1
+        except QueueFull:
+            update_status(task_dir, "Error: Interrupted by a restart, retry with /retry/<task_id>")
+            logger.warning(f"Queue full, task {task_id} left for /retry")
+    if resumed:
+        logger.info(f"Resumed {resumed} interrupted tasks")
+    return resumed
+
+def validate_num_scenes(num_scenes):
+    """Return an error message if num_scenes is not valid, else None."""
+    if not isinstance(num_scenes, int) or isinstance(num_scenes, bool) or num_scenes <= 0:
+        return "num_scenes must be a positive integer"
+    if num_scenes > 6:
+        return "num_scenes cannot exceed 6"
+    return None
+
+def validate_profile(profile):
+    """Return an error message if profile is not a known render profile, else None."""
+    if not isinstance(profile, str) or profile not in RENDER_PROFILES:
+        return f"profile must be one of {', '.join(RENDER_PROFILES)}"
+    return None
+
+def batch_dir(batch_id):
+    return os.path.join(BASE_TEMP_DIR, f"batch-{batch_id}")
+
+def run_batch(batch_id, items):
+    """
+    Plan a batch's scenes a few at a time and feed planned items to the render queue.
+
+    Planning is pipelined with rendering: each item is queued as soon as its plan is
+    ready. Items are only queued while fewer than BATCH_MAX_QUEUED jobs are waiting,
+    so a large batch streams into the workers without crowding out single requests.
+    Identical topics share one LLM call through plan_scenes, and identical image
+    prompts and narrations across the batch share one provider call.
+    """
+    def plan(item):
+        task_dir = os.path.join(BASE_TEMP_DIR, item["task_id"])
+        update_status(task_dir, "Generating scenes", progress=0)
+        with STAGE_SECONDS.time(stage="scenes"):
+            return plan_scenes(item["topic"], item["num_scenes"])
+
+    with ThreadPoolExecutor(max_workers=BATCH_PLAN_CONCURRENCY, thread_name_prefix=f"batch-{batch_id[:8]}") as pool:
+        futures = {pool.submit(plan, item): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            task_id = item["task_id"]
+            task_dir = os.path.join(BASE_TEMP_DIR, task_id)
+            try:
+                scenes_array = future.result()
+            except Exception as e:
+                update_status(task_dir, f"Error: {str(e)}")
+                logger.error(f"Batch {batch_id} task {task_id} failed to plan: {e}")
+                continue
+            if not scenes_array:
+                update_status(task_dir, "Error: No scenes generated")
+                continue
+
+            update_status(task_dir, "Queued", progress=0)
+            while True:
+                if job_queue.depth() >= BATCH_MAX_QUEUED:
+                    time.sleep(1)
+                    continue
+                try:
+                    job_queue.submit(task_id, generate_video_async, task_id, item["topic"], item["num_scenes"], scenes_array)
+                    break
+                except QueueFull as e:
+                    time.sleep(e.retry_after)
+    logger.debug(f"Batch {batch_id} fully queued")
+
+class _ChunkWriter:
+    """Collects what zipfile writes so it can be sent on; it has no tell(), so zipfile streams."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def stream_zip(files, chunk_size=1024 * 1024):
+    """
+    Yield a zip of (arcname, path) files as it is written, without storing it anywhere.
+
+    The videos are already compressed, so they are stored as they are and the zip costs
+    one read of each video; memory stays at about one chunk however large the batch.
+    """
+    writer = _ChunkWriter()
+    with zipfile.ZipFile(writer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for name, path in files:
+            with open(path, "rb") as src, archive.open(name, "w", force_zip64=True) as dest:
+                while True:
+                    chunk = src.read(chunk_size)
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    yield writer.take()
+            yield writer.take()
+    yield writer.take()
+
+def load_batch(batch_id):
+    path = os.path.join(batch_dir(batch_id), "batch.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def batch_items_status(batch):
+    items = []
+    for item in batch["items"]:
+        _, status_data = get_status(item["task_id"])
+        if status_data is None:
+            entry = {"state": "FAILURE", "status": "Task not found"}
+        else:
+            entry = progress_response(item["task_id"], status_data)
+        entry.update(task_id=item["task_id"], topic=item["topic"])
+        items.append(entry)
+    return items
+
 @app.route('/generate_clip', methods=['POST'])
 @swag_from({
     'tags': ['Video Generation'],
@@ -153,7 +545,13 @@ def get_memory_usage():
                 'type': 'object',
                 'properties': {
                     'topic': {'type': 'string', 'example': 'A journey through space'},
-                    'num_scenes': {'type': 'integer', 'example': 3}
+                    'num_scenes': {'type': 'integer', 'example': 3},
+                    'profile': {'type': 'string', 'enum': list(RENDER_PROFILES), 'example': 'standard',
+                                'description': 'Render profile: draft renders fastest, archive gives the best quality'},
+                    'preview': {'type': 'boolean', 'example': True,
+                                'description': 'Render a low resolution preview first, available from /download/<task_id>?variant=preview'},
+                    'full_render': {'type': 'boolean', 'example': True,
+                                    'description': 'With preview, also render the full video straight away. If false, the task stops at "Preview ready" until POST /render/<task_id>'}
                 },
                 'required': ['topic', 'num_scenes']
             }
@@ -165,7 +563,8 @@ def get_memory_usage():
             'schema': {
                 'type': 'object',
                 'properties': {
-                    'task_id': {'type': 'string', 'example': '123e4567-e89b-12d3-a456-426614174000'}
+                    'task_id': {'type': 'string', 'example': '123e4567-e89b-12d3-a456-426614174000'},
+                    'queue_position': {'type': 'integer', 'example': 1}
                 }
             }
         },
@@ -177,6 +576,15 @@ def get_memory_usage():
                     'error': {'type': 'string', 'example': 'Missing topic or num_scenes'}
                 }
             }
+        },
+        429: {
+            'description': 'Job queue is full, retry after the number of seconds in the Retry-After header',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'error': {'type': 'string', 'example': 'Too many queued jobs, try again later'}
+                }
+            }
         }
     }
 })
@@ -188,16 +596,398 @@ def start_generate_video():
     topic = data["topic"]
     num_scenes = data["num_scenes"]
     
-    if not isinstance(num_scenes, int) or num_scenes <= 0:
-        return jsonify({"error": "num_scenes must be a positive integer"}), 400
-    if num_scenes > 6:
-        return jsonify({"error": "num_scenes cannot exceed 6"}), 400
+    profile = data.get("profile", RENDER_PROFILE)
+    preview = data.get("preview", False)
+    full_render = data.get("full_render", True)
+    
+    error = validate_num_scenes(num_scenes) or validate_profile(profile)
+    if error:
+        return jsonify({"error": error}), 400
+    if not isinstance(preview, bool) or not isinstance(full_render, bool):
+        return jsonify({"error": "preview and full_render must be booleans"}), 400
+    if not preview and not full_render:
+        return jsonify({"error": "full_render can only be false with preview"}), 400
 
     task_id = str(uuid.uuid4())
-    os.makedirs(os.path.join(BASE_TEMP_DIR, task_id), exist_ok=True)
-    update_status(os.path.join(BASE_TEMP_DIR, task_id), "Queued")
-    threading.Thread(target=generate_video_async, args=(task_id, topic, num_scenes)).start()
-    return jsonify({"task_id": task_id}), 202
+    task_dir = os.path.join(BASE_TEMP_DIR, task_id)
+    os.makedirs(task_dir, exist_ok=True)
+    TaskManifest(task_dir).update(topic=topic, num_scenes=num_scenes, profile=profile,
+                                  preview=preview, full_render=full_render)
+    update_status(task_dir, "Queued")
+    try:
+        position = job_queue.submit(task_id, generate_video_async, task_id, topic, num_scenes)
+    except QueueFull as e:
+        safe_rmtree(task_dir)
+        task_store.delete(task_id)
+        response = jsonify({"error": "Too many queued jobs, try again later"})
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response, 429
+    return jsonify({"task_id": task_id, "queue_position": position}), 202
+
+@app.route('/generate_clips/batch', methods=['POST'])
+@swag_from({
+    'tags': ['Video Generation'],
+    'summary': 'Start a batch of video generation tasks',
+    'description': 'Accepts many topics at once and schedules them as one batch. Returns a batch id and a task id per topic; each task can also be followed with /progress/<task_id>.',
+    'parameters': [
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': True,
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'topics': {
+                        'type': 'array',
+                        'description': 'Topic strings, or objects with topic and num_scenes',
+                        'items': {},
+                        'example': ['A journey through space', {'topic': 'How volcanoes work', 'num_scenes': 4}]
+                    },
+                    'num_scenes': {'type': 'integer', 'example': 3, 'description': 'Default for topics given as strings'},
+                    'profile': {'type': 'string', 'enum': list(RENDER_PROFILES), 'example': 'draft',
+                                'description': 'Render profile, also settable per topic'}
+                },
+                'required': ['topics']
+            }
+        }
+    ],
+    'responses': {
+        202: {
+            'description': 'Batch accepted',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'batch_id': {'type': 'string', 'example': '0f8fad5b-d9cb-469f-a165-70867728950e'},
+                    'tasks': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'task_id': {'type': 'string'},
+                                'topic': {'type': 'string'}
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        400: {
+            'description': 'Invalid input',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'error': {'type': 'string', 'example': 'topics must be a non-empty list'}
+                }
+            }
+        }
+    }
+})
+def start_generate_batch():
+    data = request.get_json()
+    topics = data.get("topics") if isinstance(data, dict) else None
+    if not isinstance(topics, list) or not topics:
+        return jsonify({"error": "topics must be a non-empty list"}), 400
+    if len(topics) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"A batch cannot have more than {BATCH_MAX_ITEMS} topics"}), 400
+
+    items = []
+    for index, entry in enumerate(topics):
+        if not isinstance(entry, dict):
+            entry = {"topic": entry}
+        topic = entry.get("topic")
+        num_scenes = entry.get("num_scenes", data.get("num_scenes"))
+        profile = entry.get("profile", data.get("profile", RENDER_PROFILE))
+        if not isinstance(topic, str) or not topic:
+            return jsonify({"error": f"topics[{index}]: missing topic"}), 400
+        error = validate_num_scenes(num_scenes) or validate_profile(profile)
+        if error:
+            return jsonify({"error": f"topics[{index}]: {error}"}), 400
+        items.append({"task_id": str(uuid.uuid4()), "topic": topic, "num_scenes": num_scenes, "profile": profile})
+
+    batch_id = str(uuid.uuid4())
+    os.makedirs(batch_dir(batch_id), exist_ok=True)
+    with open(os.path.join(batch_dir(batch_id), "batch.json"), "w") as f:
+        json.dump({"batch_id": batch_id, "created_at": time.time(), "items": items}, f)
+    for item in items:
+        task_dir = os.path.join(BASE_TEMP_DIR, item["task_id"])
+        os.makedirs(task_dir, exist_ok=True)
+        TaskManifest(task_dir).update(topic=item["topic"], num_scenes=item["num_scenes"], profile=item["profile"])
+        update_status(task_dir, "Queued", batch_id=batch_id)
+
+    threading.Thread(target=run_batch, args=(batch_id, items), name=f"batch-{batch_id[:8]}", daemon=True).start()
+    return jsonify({
+        "batch_id": batch_id,
+        "tasks": [{"task_id": item["task_id"], "topic": item["topic"]} for item in items]
+    }), 202
+
+@app.route('/batch/<batch_id>', methods=['GET'])
+@swag_from({
+    'tags': ['Video Generation'],
+    'summary': 'Check batch progress',
+    'description': 'Aggregated progress of a batch plus the progress of each of its tasks.',
+    'parameters': [
+        {
+            'name': 'batch_id',
+            'in': 'path',
+            'type': 'string',
+            'required': True,
+            'description': 'The ID of the batch'
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Batch status',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'state': {'type': 'string', 'enum': ['PROGRESS', 'SUCCESS', 'FAILURE'], 'example': 'PROGRESS'},
+                    'progress': {'type': 'integer', 'example': 40},
+                    'counts': {'type': 'object', 'example': {'PROGRESS': 3, 'SUCCESS': 7, 'FAILURE': 0}},
+                    'tasks': {'type': 'array', 'items': {'type': 'object'}},
+                    'download_url': {'type': 'string', 'example': '/batch/0f8fad5b-d9cb-469f-a165-70867728950e/download'}
+                }
+            }
+        },
+        404: {
+            'description': 'Batch not found',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'error': {'type': 'string', 'example': 'Batch not found'}
+                }
+            }
+        }
+    }
+})
+def get_batch_progress(batch_id):
+    batch = load_batch(batch_id)
+    if batch is None:
+        return jsonify({"error": "Batch not found"}), 404
+
+    items = batch_items_status(batch)
+    counts = {"PROGRESS": 0, "PREVIEW": 0, "SUCCESS": 0, "FAILURE": 0}
+    for item in items:
+        counts[item["state"]] += 1
+    if counts["PROGRESS"]:
+        state = "PROGRESS"
+    else:
+        state = "SUCCESS" if not counts["FAILURE"] else "FAILURE"
+    progress = sum(100 if item["state"] != "PROGRESS" else item.get("progress", 0) for item in items) // len(items)
+
+    response = {"batch_id": batch_id, "state": state, "progress": progress, "counts": counts, "tasks": items}
+    if counts["SUCCESS"]:
+        response["download_url"] = f"/batch/{batch_id}/download"
+    return jsonify(response)
+
+@app.route('/batch/<batch_id>/download', methods=['GET'])
+@swag_from({
+    'tags': ['Video Generation'],
+    'summary': 'Download a batch',
+    'description': 'Downloads a zip with the videos of every completed task in the batch so far. The zip is streamed as it is built, so it has no Content-Length and does not support Range requests.',
+    'parameters': [
+        {
+            'name': 'batch_id',
+            'in': 'path',
+            'type': 'string',
+            'required': True,
+            'description': 'The ID of the batch'
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Zip of the completed videos',
+            'content': {
+                'application/zip': {
+                    'schema': {
+                        'type': 'string',
+                        'format': 'binary'
+                    }
+                }
+            }
+        },
+        400: {
+            'description': 'No completed tasks yet',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'error': {'type': 'string', 'example': 'No completed tasks in this batch yet'}
+                }
+            }
+        },
+        404: {
+            'description': 'Batch not found',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'error': {'type': 'string', 'example': 'Batch not found'}
+                }
+            }
+        }
+    }
+})
+def download_batch(batch_id):
+    batch = load_batch(batch_id)
+    if batch is None:
+        return jsonify({"error": "Batch not found"}), 404
+
+    done = []
+    for index, item in enumerate(batch["items"]):
+        _, status_data = get_status(item["task_id"])
+        if status_data and status_data["status"] == "Done" and os.path.exists(status_data["output_file"]):
+            done.append((f"{index:04d}-{item['task_id']}.mp4", status_data["output_file"]))
+    if not done:
+        return jsonify({"error": "No completed tasks in this batch yet"}), 400
+
+    return Response(stream_zip(done), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename=batch-{batch_id}.zip'})
+
+@app.route('/retry/<task_id>', methods=['POST'])
+@swag_from({
+    'tags': ['Video Generation'],
+    'summary': 'Retry a failed task',
+    'description': 'Queues a failed task again. It resumes from its last checkpoint: the scene plan and the assets that were already generated are reused, and only missing or failed assets are generated.',
+    'parameters': [
+        {
+            'name': 'task_id',
+            'in': 'path',
+            'type': 'string',
+            'required': True,
+            'description': 'The ID of the failed task'
+        }
+    ],
+    'responses': {
+        202: {
+            'description': 'Task queued again',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'task_id': {'type': 'string', 'example': '123e4567-e89b-12d3-a456-426614174000'},
+                    'queue_position': {'type': 'integer', 'example': 1}
+                }
+            }
+        },
+        404: {
+            'description': 'Task not found',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'error': {'type': 'string', 'example': 'Task not found'}
+                }
+            }
+        },
+        409: {
+            'description': 'Task is still running or already done',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'error': {'type': 'string', 'example': 'Only failed tasks can be retried'}
+                }
+            }
+        },
+        429: {
+            'description': 'Render queue is full',
+            'headers': {
+                'Retry-After': {'type': 'integer', 'description': 'Seconds to wait before retrying'}
+            },
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'error': {'type': 'string', 'example': 'Too many queued jobs, try again later'}
+                }
+            }
+        }
+    }
+})
+def retry_task(task_id):
+    _, status_data = get_status(task_id)
+    if status_data is None or not TaskManifest.exists(os.path.join(BASE_TEMP_DIR, task_id)):
+        return jsonify({"error": "Task not found"}), 404
+    if task_state(status_data["status"]) != "FAILURE":
+        return jsonify({"error": "Only failed tasks can be retried"}), 409
+    try:
+        position = resume_task(task_id)
+    except QueueFull as e:
+        response = jsonify({"error": "Too many queued jobs, try again later"})
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response, 429
+    return jsonify({"task_id": task_id, "queue_position": position}), 202
+
+@app.route('/render/<task_id>', methods=['POST'])
+@swag_from({
+    'tags': ['Video Generation'],
+    'summary': 'Render the full video of a previewed task',
+    'description': 'Queues the full quality render of a task created with preview and full_render false. The scenes and assets of the preview are reused.',
+    'parameters': [
+        {
+            'name': 'task_id',
+            'in': 'path',
+            'type': 'string',
+            'required': True,
+            'description': 'The ID of the task'
+        }
+    ],
+    'responses': {
+        202: {
+            'description': 'Full render queued',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'task_id': {'type': 'string', 'example': '123e4567-e89b-12d3-a456-426614174000'},
+                    'queue_position': {'type': 'integer', 'example': 1}
+                }
+            }
+        },
+        404: {
+            'description': 'Task not found',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'error': {'type': 'string', 'example': 'Task not found'}
+                }
+            }
+        },
+        409: {
+            'description': 'The task has no preview waiting for a full render',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'error': {'type': 'string', 'example': 'Only tasks with status "Preview ready" can be rendered'}
+                }
+            }
+        },
+        429: {
+            'description': 'Render queue is full',
+            'headers': {
+                'Retry-After': {'type': 'integer', 'description': 'Seconds to wait before retrying'}
+            },
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'error': {'type': 'string', 'example': 'Too many queued jobs, try again later'}
+                }
+            }
+        }
+    }
+})
+def render_full(task_id):
+    task_dir = os.path.join(BASE_TEMP_DIR, task_id)
+    _, status_data = get_status(task_id)
+    if status_data is None or not TaskManifest.exists(task_dir):
+        return jsonify({"error": "Task not found"}), 404
+    if task_state(status_data["status"]) != "PREVIEW":
+        return jsonify({"error": 'Only tasks with status "Preview ready" can be rendered'}), 409
+    TaskManifest(task_dir).update(full_render=True)
+    try:
+        position = resume_task(task_id)
+    except Exception as e:
+        # resume_task has put back the "Preview ready" status; the preview is still waiting for a render
+        TaskManifest(task_dir).update(full_render=False)
+        if not isinstance(e, QueueFull):
+            raise
+        response = jsonify({"error": "Too many queued jobs, try again later"})
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response, 429
+    return jsonify({"task_id": task_id, "queue_position": position}), 202
 
 @app.route('/progress/<task_id>', methods=['GET'])
 @swag_from({
@@ -220,9 +1010,13 @@ def start_generate_video():
             'schema': {
                 'type': 'object',
                 'properties': {
-                    'state': {'type': 'string', 'enum': ['PENDING', 'PROGRESS', 'SUCCESS', 'FAILURE'], 'example': 'PROGRESS'},
+                    'state': {'type': 'string', 'enum': ['PENDING', 'PROGRESS', 'PREVIEW', 'SUCCESS', 'FAILURE'], 'example': 'PROGRESS'},
                     'status': {'type': 'string', 'example': 'Generating scenes'},
-                    'download_url': {'type': 'string', 'example': '/download/123e4567-e89b-12d3-a456-426614174000'}
+                    'queue_position': {'type': 'integer', 'example': 3},
+                    'progress': {'type': 'integer', 'example': 45},
+                    'scene_progress': {'type': 'object', 'example': {'scene0': 100, 'scene1': 50}},
+                    'download_url': {'type': 'string', 'example': '/download/123e4567-e89b-12d3-a456-426614174000'},
+                    'preview_url': {'type': 'string', 'example': '/download/123e4567-e89b-12d3-a456-426614174000?variant=preview'}
                 }
             }
         },
@@ -239,30 +1033,68 @@ def start_generate_video():
     }
 })
 def get_progress(task_id):
-    task_dir = os.path.join(BASE_TEMP_DIR, task_id)
-    status_file = os.path.join(task_dir, "status.json")
-    if not os.path.exists(status_file):
+    _, status_data = get_status(task_id)
+    if status_data is None:
         return jsonify({"state": "PENDING", "status": "Task not found or queued"}), 404
-    
-    with open(status_file, 'r') as f:
-        status_data = json.load(f)
-    
-    state = "PROGRESS" if status_data["status"].startswith("Error") or status_data["status"] == "Done" else "PROGRESS"
-    if status_data["status"].startswith("Error"):
-        state = "FAILURE"
-    elif status_data["status"] == "Done":
-        state = "SUCCESS"
-    
-    response = {"state": state, "status": status_data["status"]}
-    if state == "SUCCESS":
-        response["download_url"] = f"/download/{task_id}"
-    return jsonify(response)
+    return jsonify(progress_response(task_id, status_data))
+
+@app.route('/progress/<task_id>/stream', methods=['GET'])
+@swag_from({
+    'tags': ['Video Generation'],
+    'summary': 'Stream task progress',
+    'description': 'Server-Sent Events stream of progress updates for a task. Each "progress" event carries the same JSON as /progress/<task_id>; the stream ends once the task succeeds or fails.',
+    'parameters': [
+        {
+            'name': 'task_id',
+            'in': 'path',
+            'type': 'string',
+            'required': True,
+            'description': 'The ID of the task',
+            'example': '123e4567-e89b-12d3-a456-426614174000'
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'text/event-stream of progress events'
+        },
+        404: {
+            'description': 'Task not found',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'state': {'type': 'string', 'example': 'PENDING'},
+                    'status': {'type': 'string', 'example': 'Task not found or queued'}
+                }
+            }
+        }
+    }
+})
+def stream_progress(task_id):
+    version, status_data = get_status(task_id)
+    if status_data is None:
+        return jsonify({"state": "PENDING", "status": "Task not found or queued"}), 404
+
+    def events(version, status_data):
+        while status_data is not None:
+            response = progress_response(task_id, status_data)
+            yield f"event: progress\ndata: {json.dumps(response)}\n\n"
+            if response["state"] in ("SUCCESS", "FAILURE", "PREVIEW"):
+                return
+            new_version, new_data = task_store.wait(task_id, version, timeout=SSE_KEEPALIVE_SECONDS)
+            while new_version == version and new_data is not None:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                new_version, new_data = task_store.wait(task_id, version, timeout=SSE_KEEPALIVE_SECONDS)
+            version, status_data = new_version, new_data
+
+    return Response(events(version, status_data), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/download/<task_id>', methods=['GET'])
 @swag_from({
     'tags': ['Video Generation'],
     'summary': 'Download generated video',
-    'description': 'Downloads the generated video file for a completed task.',
+    'description': 'Downloads the generated video file for a completed task, or its preview as soon as that is ready.',
     'parameters': [
         {
             'name': 'task_id',
@@ -271,11 +1103,19 @@ def get_progress(task_id):
             'required': True,
             'description': 'The ID of the task',
             'example': '123e4567-e89b-12d3-a456-426614174000'
+        },
+        {
+            'name': 'variant',
+            'in': 'query',
+            'type': 'string',
+            'enum': ['full', 'preview'],
+            'required': False,
+            'description': 'full (default) for the final video, preview for the quick low resolution render'
         }
     ],
     'responses': {
         200: {
-            'description': 'Video file',
+            'description': 'Video file. Supports Range requests (206) and ETag/If-None-Match (304).',
             'content': {
                 'video/mp4': {
                     'schema': {
@@ -303,6 +1143,15 @@ def get_progress(task_id):
                 }
             }
         },
+        410: {
+            'description': 'The task files were cleaned up',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'error': {'type': 'string', 'example': 'Video was cleaned up'}
+                }
+            }
+        },
         500: {
             'description': 'Video file not found',
             'schema': {
@@ -316,13 +1165,30 @@ def get_progress(task_id):
 })
 def download_video(task_id):
     task_dir = os.path.join(BASE_TEMP_DIR, task_id)
-    status_file = os.path.join(task_dir, "status.json")
-    if not os.path.exists(status_file):
+    _, status_data = get_status(task_id)
+    if status_data is None:
         return jsonify({"error": "Task not found"}), 404
-    
-    with open(status_file, 'r') as f:
-        status_data = json.load(f)
-    
+
+    variant = request.args.get("variant", "full")
+    if variant not in ("full", "preview"):
+        return jsonify({"error": "variant must be full or preview"}), 400
+    if "purged_at" in status_data:
+        return jsonify({"error": "Video was cleaned up"}), 410
+    if variant == "preview":
+        if "preview_file" not in status_data:
+            return jsonify({"error": "Preview not ready"}), 400
+        if not os.path.exists(status_data["preview_file"]):
+            return jsonify({"error": "Video file not found"}), 500
+        # The task is still in use (the full render may be running), so no cleanup is scheduled
+        return send_file(
+            os.path.abspath(status_data["preview_file"]),
+            mimetype='video/mp4',
+            as_attachment=True,
+            download_name="preview.mp4",
+            conditional=True,
+            etag=True
+        )
+
     if status_data["status"] != "Done":
         return jsonify({"error": "Task not completed or failed"}), 400
     
@@ -330,19 +1196,101 @@ def download_video(task_id):
     if not os.path.exists(output_file):
         return jsonify({"error": "Video file not found"}), 500
 
-    with open(output_file, 'rb') as f:
-        video_data = io.BytesIO(f.read())
+    # Stream the file from disk (sendfile under servers that support wsgi.file_wrapper);
+    # conditional=True handles Range/206 and If-None-Match/304 against the ETag
     response = send_file(
-        video_data,
+        os.path.abspath(output_file),
         mimetype='video/mp4',
         as_attachment=True,
-        download_name="output_movie.mp4"
+        download_name="output_movie.mp4",
+        conditional=True,
+        etag=True
     )
-    
-    if not safe_rmtree(task_dir):
-        logger.info(f"Deferred cleanup for {task_dir}")
+    # Keep the task dir around for resumed/repeated downloads, and remove it once it has gone unused
+    response.call_on_close(lambda: schedule_cleanup(task_dir))
     return response
 
+@app.route('/tasks', methods=['GET'])
+@swag_from({
+    'tags': ['Video Generation'],
+    'summary': 'List tasks',
+    'description': 'Lists current and past tasks, newest first, optionally only those in one state. Pass the returned next value as after to get the following page.',
+    'parameters': [
+        {
+            'name': 'state',
+            'in': 'query',
+            'type': 'string',
+            'enum': list(TASK_STATES),
+            'required': False,
+            'description': 'Only list tasks in this state'
+        },
+        {
+            'name': 'limit',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'description': f'Tasks per page, at most {TASKS_PAGE_MAX} (default 100)'
+        },
+        {
+            'name': 'after',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'The next value of the previous page'
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'A page of tasks',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'tasks': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'example': {
+                                'task_id': '123e4567-e89b-12d3-a456-426614174000',
+                                'state': 'SUCCESS',
+                                'status': 'Done',
+                                'progress': 100,
+                                'output_bytes': 1834201,
+                                'created_at': 1760000000.0,
+                                'started_at': 1760000001.5,
+                                'finished_at': 1760000042.1
+                            }
+                        }
+                    },
+                    'next': {'type': 'string', 'example': '123e4567-e89b-12d3-a456-426614174000'}
+                }
+            }
+        },
+        400: {
+            'description': 'Invalid query',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'error': {'type': 'string', 'example': 'state must be one of PROGRESS, PREVIEW, SUCCESS, FAILURE'}
+                }
+            }
+        }
+    }
+})
+def list_tasks():
+    state = request.args.get("state")
+    if state is not None and state not in TASK_STATES:
+        return jsonify({"error": f"state must be one of {', '.join(TASK_STATES)}"}), 400
+    limit = request.args.get("limit", "100")
+    if not limit.isdecimal() or not 0 < int(limit) <= TASKS_PAGE_MAX:
+        return jsonify({"error": f"limit must be an integer between 1 and {TASKS_PAGE_MAX}"}), 400
+    limit = int(limit)
+
+    tasks = task_store.list(state=state, limit=limit, after=request.args.get("after"))
+    response = {"tasks": [task_summary(task_id, status_data) for task_id, status_data in tasks]}
+    if len(tasks) == limit:
+        response["next"] = tasks[-1][0]
+    return jsonify(response)
+
 @app.route('/cleanup', methods=['POST'])
 @swag_from({
     'tags': ['Maintenance'],
@@ -411,6 +1359,27 @@ def memory_usage():
         "system_memory_percent": memory["percent"]
     }), 200
 
+@app.route('/metrics', methods=['GET'])
+@swag_from({
+    'tags': ['Maintenance'],
+    'summary': 'Prometheus metrics',
+    'description': 'Stage and provider call durations, queue depth, active jobs, cache hit rates and bytes written, in the Prometheus text format. With JOB_BACKEND=sqlite the render workers\' metrics are included.',
+    'responses': {
+        200: {
+            'description': 'Metrics in the Prometheus text exposition format',
+            'content': {
+                'text/plain': {
+                    'schema': {'type': 'string'}
+                }
+            }
+        }
+    }
+})
+def metrics_endpoint():
+    # With separate render workers, the pipeline metrics are recorded in their processes
+    snapshots = job_queue.worker_metrics() if JOB_BACKEND == "sqlite" else ()
+    return Response(metrics.render(snapshots), mimetype='text/plain; version=0.0.4')
+
 @app.route('/delete_temp/<directory_name>', methods=['DELETE'])
 @swag_from({
     'tags': ['Maintenance'],
@@ -474,10 +1443,27 @@ def delete_temp_directory(directory_name):
         return jsonify({"error": "Specified path is not a directory"}), 400
 
     if safe_rmtree(task_dir):
+        task_store.purge(directory_name)
         return jsonify({"message": f"Successfully deleted {directory_name}"}), 200
     else:
         return jsonify({"error": f"Failed to delete {directory_name}"}), 500
 
 if __name__ == '__main__':
-    cleanup_old_temp_dirs()
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Video Generation API")
+    parser.add_argument('--worker', action='store_true',
+                        help="Run render workers that take jobs from JOB_DB_PATH instead of serving the API")
+    parser.add_argument('--processes', type=int, default=RENDER_WORKERS,
+                        help="Number of render worker processes (with --worker)")
+    args = parser.parse_args()
+
+    if args.worker:
+        run_workers(JOB_DB_PATH, {"generate_video_async": generate_video_async}, processes=args.processes,
+                    memory_budget=MemoryBudget(RENDER_RSS_BUDGET_MB, RENDER_JOB_RSS_MB))
+    else:
+        import_status_files()
+        cleanup_old_temp_dirs()
+        debug = True
+        # With the reloader only the child process serves requests, so it is the one to resume jobs in
+        if JOB_BACKEND == "thread" and (is_running_from_reloader() or not debug):
+            resume_interrupted_tasks()
+        app.run(host='0.0.0.0', port=5000, debug=debug)
\ No newline at end of file
@@ -0,0 +1,60 @@
+import json
+import os
+import threading
+
+
+class TaskManifest:
+    """
+    Checkpoint of a task's progress, kept as manifest.json in the task directory.
+
+    It records the request (topic and num_scenes), the scene plan once it exists, and
+    which scene assets have been generated. A retried or restarted task reads it back
+    to skip the steps that already completed. The file is rewritten atomically, so a
+    crash never leaves a partial manifest behind.
+
+    :param task_dir: The task's directory.
+    """
+
+    FILENAME = "manifest.json"
+
+    def __init__(self, task_dir):
+        self.path = os.path.join(task_dir, self.FILENAME)
+        self._lock = threading.Lock()
+        try:
+            with open(self.path) as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            self.data = {}
+
+    @classmethod
+    def exists(cls, task_dir):
+        return os.path.exists(os.path.join(task_dir, cls.FILENAME))
+
+    @property
+    def scenes(self):
+        """The saved scene plan, or None if planning had not finished."""
+        return self.data.get("scenes")
+
+    def completed_assets(self):
+        """Map of scene id to the asset kinds ("image", "audio") already generated."""
+        return {scene_id: set(kinds) for scene_id, kinds in self.data.get("assets", {}).items()}
+
+    def update(self, **fields):
+        """Merge fields into the manifest and persist it."""
+        with self._lock:
+            self.data.update(fields)
+            self._write()
+
+    def mark_asset(self, scene_id, kind):
+        """Record that one of a scene's assets is generated and checkpointed."""
+        with self._lock:
+            kinds = self.data.setdefault("assets", {}).setdefault(scene_id, [])
+            if kind not in kinds:
+                kinds.append(kind)
+                self._write()
+
+    def _write(self):
+        tmp_file = self.path + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(self.data, f)
+        os.replace(tmp_file, self.path)
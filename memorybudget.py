@@ -0,0 +1,81 @@
+import logging
+import os
+import time
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+class MemoryBudget:
+    """
+    Admission control for renders against a resident memory (RSS) budget.
+
+    Before a render starts, the RSS of a process tree is measured. The tree is this
+    process, or the worker supervisor, plus every worker and every ffmpeg child. A
+    new render is admitted only if one more render's footprint still fits in the
+    budget. One render's footprint is the larger of `job_estimate_mb` and what the
+    running renders currently use each, above the idle baseline. Renders started
+    moments ago count at that footprint even before their memory shows up.
+
+    A render is always admitted when none is running, so a budget smaller than one
+    render slows the queue down instead of stalling it.
+
+    :param budget_mb: RSS budget in MB; 0 disables the check.
+    :param job_estimate_mb: Expected RSS of one render, used until one can be measured.
+    :param root_pid: Process whose tree is measured; defaults to the current process.
+    """
+
+    def __init__(self, budget_mb, job_estimate_mb=300, root_pid=None):
+        self.budget = budget_mb * MB
+        self.job_estimate = job_estimate_mb * MB
+        self.root_pid = root_pid or os.getpid()
+        self._baseline = None
+
+    @property
+    def enabled(self):
+        return self.budget > 0
+
+    def tree_rss(self):
+        """RSS in bytes of the root process and all of its descendants."""
+        try:
+            root = psutil.Process(self.root_pid)
+            processes = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return 0
+        total = 0
+        for proc in processes:
+            try:
+                total += proc.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+
+    def admits(self, active):
+        """Return whether another render may start while `active` renders are running."""
+        if not self.enabled:
+            return True
+        rss = self.tree_rss()
+        if active == 0 or self._baseline is None:
+            # Nothing is rendering, so this is what the idle processes take
+            self._baseline = rss
+        if active == 0:
+            return True
+        per_job = max(self.job_estimate, (rss - self._baseline) / active)
+        return self._baseline + per_job * (active + 1) <= self.budget
+
+    def wait(self, active_jobs, poll=0.5):
+        """
+        Block until another render fits in the budget.
+
+        :param active_jobs: Callable returning the number of renders running now.
+        :param poll: Seconds between checks.
+        """
+        deferred = False
+        while not self.admits(active_jobs()):
+            if not deferred:
+                logger.info(f"Render deferred, RSS {self.tree_rss() / MB:.0f} MB of {self.budget / MB:.0f} MB budget in use")
+                deferred = True
+            time.sleep(poll)
@@ -0,0 +1,219 @@
+from contextlib import contextmanager
+import bisect
+import threading
+import time
+
+# Lightweight in-process metrics rendered in the Prometheus text format by /metrics.
+# Values are per process. `main.py --worker` processes publish a snapshot() of theirs
+# (see durablequeue.push_metrics), and the API adds those in when it renders.
+
+# Gauges of a snapshot older than this are left out, since its process may be gone
+SNAPSHOT_GAUGE_MAX_AGE = 60
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_registry = []
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self, snapshots=()):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self._samples(self._merged(snapshots)))
+        return "\n".join(lines)
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def _merged(self, snapshots):
+        """This process's values plus those of the same metric in other processes' snapshots."""
+        return self._add_snapshots(self._own(), [snapshot for snapshot in snapshots if self._includes(snapshot)])
+
+    def _add_snapshots(self, values, snapshots):
+        for snapshot in snapshots:
+            for key, value in snapshot["values"].get(self.name, ()):
+                key = tuple(key)
+                values[key] = self._add(values[key], value) if key in values else self._copy(value)
+        return values
+
+    def _own(self):
+        with self._lock:
+            return {key: self._copy(value) for key, value in self._values.items()}
+
+    def _includes(self, snapshot):
+        return True
+
+    def _copy(self, value):
+        return value
+
+    def _add(self, value, other):
+        return value + other
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self, values):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in values.items()]
+
+
+class Gauge(_Metric):
+    """A gauge that is either set directly or read from `callback` at scrape time.
+
+    The callback returns a number, or a dict mapping label-value tuples to numbers.
+    Callback gauges describe this process only, so they are left out of snapshots.
+    """
+
+    type = "gauge"
+
+    def __init__(self, name, help, labelnames=(), callback=None):
+        super().__init__(name, help, labelnames)
+        self.callback = callback
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def snapshot(self):
+        if self.callback is None:
+            return super().snapshot()
+        return []
+
+    def _own(self):
+        if self.callback is None:
+            return super()._own()
+        value = self.callback()
+        return dict(value) if isinstance(value, dict) else {(): value}
+
+    def _includes(self, snapshot):
+        return self.callback is None and time.time() - snapshot["time"] <= SNAPSHOT_GAUGE_MAX_AGE
+
+    def _samples(self, values):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in values.items()]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the with-block takes, even if it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), [list(counts), total]] for key, (counts, total) in self._values.items()]
+
+    def _copy(self, value):
+        counts, total = value
+        return list(counts), total
+
+    def _add(self, value, other):
+        (counts, total), (other_counts, other_total) = value, other
+        return [a + b for a, b in zip(counts, other_counts)], total + other_total
+
+    def _samples(self, values):
+        lines = []
+        for key, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+def render(snapshots=()):
+    """
+    Render every registered metric in the Prometheus text exposition format.
+
+    :param snapshots: snapshot() results of other processes, added to this process's values.
+    """
+    return "\n".join(metric.render(snapshots) for metric in _registry) + "\n"
+
+
+def snapshot():
+    """This process's metric values as JSON-serializable data, for render() in another process."""
+    return {"time": time.time(), "values": {metric.name: metric.snapshot() for metric in _registry}}
+
+
+def combine(snapshots):
+    """
+    Add up the counters and histograms of several snapshots into one.
+
+    Used for processes that have exited: their totals must keep counting, while their
+    gauges no longer mean anything and are left out.
+    """
+    values = {}
+    for metric in _registry:
+        if not isinstance(metric, Gauge):
+            merged = metric._add_snapshots({}, snapshots)
+            values[metric.name] = [[list(key), value] for key, value in merged.items()]
+    return {"time": 0, "values": values}
+
+
+STAGE_SECONDS = Histogram(
+    "text2clip_stage_seconds", "Duration of each pipeline stage in seconds.", labelnames=("stage",)
+)
+PROVIDER_SECONDS = Histogram(
+    "text2clip_provider_call_seconds", "Duration of calls to external providers in seconds.", labelnames=("provider",)
+)
+JOBS_TOTAL = Counter("text2clip_jobs_total", "Finished jobs by result.", labelnames=("result",))
+ACTIVE_JOBS = Gauge("text2clip_active_jobs", "Jobs currently running, in the API and its render workers.")
+BYTES_WRITTEN = Counter("text2clip_bytes_written_total", "Bytes of generated files written.", labelnames=("kind",))
+CACHE_LOOKUPS = Counter(
+    "text2clip_cache_lookups_total", "Cache lookups by cache and result.", labelnames=("cache", "result")
+)
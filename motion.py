@@ -0,0 +1,231 @@
+from captions import caption_overlay
+import os
+import numpy as np
+
+# MOTION=kenburns slowly zooms and pans across each scene's image and crossfades from
+# one scene into the next; "none" keeps the static slideshow.
+MOTIONS = ("none", "kenburns")
+MOTION = os.getenv("MOTION", "none")
+if MOTION not in MOTIONS:
+    raise ValueError(f"Unknown MOTION {MOTION!r}, expected one of {', '.join(MOTIONS)}")
+# How far a scene zooms in (or out), as a magnification of the full image
+MOTION_ZOOM = float(os.getenv("MOTION_ZOOM", "1.15"))
+CROSSFADE_SECONDS = float(os.getenv("CROSSFADE_SECONDS", "0.5"))
+# Frames are computed this many output pixels at a time, which bounds the float32 working set
+MOTION_BATCH_PIXELS = int(os.getenv("MOTION_BATCH_PIXELS", str(512 * 1024)))
+
+# Pans cycled through scene by scene, as the crop's (x, y) start and end in 0..1 of its free travel
+_PANS = [
+    ((0.0, 0.5), (1.0, 0.5)),
+    ((1.0, 0.0), (0.0, 1.0)),
+    ((0.5, 1.0), (0.5, 0.0)),
+    ((0.0, 0.0), (1.0, 1.0)),
+]
+
+
+class KenBurns:
+    """
+    The zoom and pan of one scene, as crop poses over its duration.
+
+    Even scenes zoom in and odd scenes zoom out, and the pan direction changes from
+    scene to scene, so consecutive scenes never move the same way.
+    """
+
+    def __init__(self, scene_index, zoom=None):
+        zoom = zoom or MOTION_ZOOM
+        self.zooms = (1.0, zoom) if scene_index % 2 == 0 else (zoom, 1.0)
+        self.pan = _PANS[scene_index % len(_PANS)]
+
+    def poses(self, t):
+        """
+        Crop poses at times t (an array in 0..1 over the scene).
+
+        :return: (zoom, x, y) arrays; x and y place the crop within its free travel, 0..1.
+        """
+        eased = t * t * (3 - 2 * t)
+        start_zoom, end_zoom = self.zooms
+        # Geometric, so the zoom looks steady rather than speeding up
+        zoom = start_zoom * (end_zoom / start_zoom) ** eased
+        (x0, y0), (x1, y1) = self.pan
+        return zoom, x0 + (x1 - x0) * eased, y0 + (y1 - y0) * eased
+
+
+class SourcePyramid:
+    """
+    An image and its successive halvings (2x2 box averages), computed once per scene.
+
+    Crops are resampled from the smallest level that still has at least as many
+    pixels as the output, so a downscale never skips source pixels (no aliasing)
+    and never touches more of them than it needs to.
+    """
+
+    def __init__(self, image, min_height):
+        level = np.asarray(image, dtype=np.uint8)
+        self.levels = [level]
+        while level.shape[0] // 2 >= min_height:
+            height, width = level.shape[0] // 2 * 2, level.shape[1] // 2 * 2
+            blocks = level[:height, :width].reshape(height // 2, 2, width // 2, 2, 3)
+            level = (blocks.mean(axis=(1, 3)) + 0.5).astype(np.uint8)
+            self.levels.append(level)
+
+    def level(self, crop_height, out_height):
+        """Return (level as RGBX pixels, its scale relative to the image) for crops of crop_height image rows."""
+        full_height = self.levels[0].shape[0]
+        for level in reversed(self.levels):
+            scale = level.shape[0] / full_height
+            if crop_height * scale >= out_height or level is self.levels[0]:
+                rgbx = np.zeros(level.shape[:2] + (4,), dtype=np.uint8)
+                rgbx[..., :3] = level
+                return _pixels(rgbx), scale
+
+
+# Frames are RGBX: each pixel is 4 bytes, so it moves as one uint32 in the gathers and
+# the encoder reads it as rgb0. Interpolation is int16 fixed point with weights in
+# 1/128ths, which keeps (high - low) * weight within int16 and runs about 3x faster
+# than the same blend in float32.
+_WEIGHT_BITS = 7
+_WEIGHT_ONE = 1 << _WEIGHT_BITS
+
+
+def _pixels(frames):
+    """View (..., 4) uint8 RGBX as (...) uint32 pixels."""
+    return frames.view(np.uint32)[..., 0]
+
+
+def _channels(pixels):
+    """View (...) uint32 pixels as (..., 4) uint8 RGBX."""
+    return pixels.view(np.uint8).reshape(pixels.shape + (4,))
+
+
+def _lerp(low, high, weight):
+    """low + (high - low) * weight / 128 for uint8 arrays, rounded."""
+    mixed = high.astype(np.int16)
+    mixed -= low
+    mixed *= weight
+    mixed += _WEIGHT_ONE // 2
+    mixed >>= _WEIGHT_BITS
+    mixed += low
+    return mixed.astype(np.uint8)
+
+
+def _sample_positions(start, length, out_length, size):
+    """Bilinear source positions for out_length output pixels of each crop, as (index, weight)."""
+    positions = start[:, None] + (np.arange(out_length) + 0.5) * (length[:, None] / out_length) - 0.5
+    np.clip(positions, 0, size - 1, out=positions)
+    index = np.minimum(positions.astype(np.intp), size - 2)
+    return index, np.rint((positions - index) * _WEIGHT_ONE).astype(np.int16)
+
+
+def resample_crops(source, top, left, crop_height, crop_width, out_height, out_width):
+    """
+    Resample a batch of axis-aligned crops of one image to the output size.
+
+    Bilinear and separable: the rows of every frame in the batch are interpolated in
+    one pass, then each frame's columns, so the cost is a few vectorized passes per
+    batch instead of Python work per frame or per pixel.
+
+    :param source: RGBX pixels of shape (height, width), uint32.
+    :param top, left, crop_height, crop_width: Arrays of shape (frames,) in source pixels.
+    :return: RGBX frames of shape (frames, out_height, out_width, 4), uint8.
+    """
+    height, width = source.shape
+    rows, row_weight = _sample_positions(top, crop_height, out_height, height)
+    cols, col_weight = _sample_positions(left, crop_width, out_width, width)
+
+    # Only the columns some crop in the batch reads from
+    first = cols.min()
+    band = source[:, first:cols.max() + 2]
+    cols -= first
+
+    resized = _pixels(_lerp(_channels(band[rows]), _channels(band[rows + 1]), row_weight[:, :, None, None]))
+    # Spelled out per channel, so the multiply runs over contiguous weights
+    col_weight = np.repeat(col_weight[:, :, None], 4, axis=2)
+    out = np.empty((len(top), out_height, out_width, 4), dtype=np.uint8)
+    for frame in range(len(top)):
+        low = np.take(resized[frame], cols[frame], axis=1)
+        high = np.take(resized[frame], cols[frame] + 1, axis=1)
+        out[frame] = _lerp(_channels(low), _channels(high), col_weight[frame])
+    return out
+
+
+class SceneMotion:
+    """
+    Renders the frames of one scene's Ken Burns move at the output size.
+
+    The caption is laid over each frame after the move, so it stays put on screen
+    while the image moves under it.
+
+    :param image: RGB uint8 frame of the scene.
+    :param scene_index: Position of the scene in the video, which picks its move.
+    :param size: Output (width, height).
+    :param caption: Optional caption text.
+    """
+
+    def __init__(self, image, scene_index, size, caption=None):
+        self.width, self.height = size
+        self.path = KenBurns(scene_index)
+        image_height, image_width = image.shape[:2]
+        self.image_size = (image_width, image_height)
+        # The source level is fixed for the whole move, so the sharpness never jumps between levels
+        closest = image_height / max(self.path.zooms)
+        self.source, self.scale = SourcePyramid(image, self.height).level(closest, self.height)
+
+        self.overlay = None
+        overlay = caption_overlay(self.height, self.width, caption)
+        if overlay is not None:
+            # The same multiply-add as caption_frame, in fixed point and RGBX
+            band_top, gain, offset = overlay
+            gain = np.repeat(np.rint(gain * _WEIGHT_ONE), 4, axis=2).astype(np.uint16)
+            offset = np.pad(offset * _WEIGHT_ONE + _WEIGHT_ONE // 2, ((0, 0), (0, 0), (0, 1))).astype(np.uint16)
+            self.overlay = (band_top, gain, offset)
+
+    def frames_at(self, t):
+        """RGBX frames of shape (len(t), height, width, 4) at times t in 0..1."""
+        zoom, x, y = self.path.poses(np.asarray(t, dtype=np.float64))
+        image_width, image_height = self.image_size
+        crop_width = image_width / zoom
+        crop_height = image_height / zoom
+        left = (image_width - crop_width) * x
+        top = (image_height - crop_height) * y
+        frames = resample_crops(
+            self.source, top * self.scale, left * self.scale, crop_height * self.scale, crop_width * self.scale,
+            self.height, self.width,
+        )
+        if self.overlay is not None:
+            band_top, gain, offset = self.overlay
+            band = frames[:, band_top:].astype(np.uint16)
+            band *= gain
+            band += offset
+            band >>= _WEIGHT_BITS
+            frames[:, band_top:] = band
+        return frames
+
+    def batches(self, count):
+        """Yield the scene's `count` frames, first to last, as batches of RGBX frames."""
+        t = np.linspace(0, 1, count) if count > 1 else np.zeros(1)
+        size = _batch_size(self.width, self.height)
+        for start in range(0, count, size):
+            yield self.frames_at(t[start:start + size])
+
+
+def crossfade_batches(outgoing, incoming, count):
+    """
+    Yield `count` frames blending the last frame of one SceneMotion into the first of the next.
+
+    :return: Batches of RGBX frames, like SceneMotion.batches.
+    """
+    last = outgoing.frames_at([1.0])
+    delta = incoming.frames_at([0.0]).astype(np.int16)
+    delta -= last
+    weights = np.rint((np.arange(count) + 0.5) / count * _WEIGHT_ONE).astype(np.int16)
+    size = _batch_size(outgoing.width, outgoing.height)
+    for start in range(0, count, size):
+        mixed = delta * weights[start:start + size, None, None, None]
+        mixed += _WEIGHT_ONE // 2
+        mixed >>= _WEIGHT_BITS
+        mixed += last
+        yield mixed.astype(np.uint8)
+
+
+def _batch_size(width, height):
+    return max(1, MOTION_BATCH_PIXELS // (width * height))
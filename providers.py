@@ -0,0 +1,157 @@
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from gtts import gTTSError
+from urllib.parse import urlsplit
+import openai
+import together
+import asyncio
+import functools
+import logging
+import os
+import random
+import threading
+import httpx
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Every outbound provider call goes through one asyncio loop running on a background
+# thread. It owns a shared keep-alive HTTP connection pool, caps concurrent calls per
+# host and retries transient failures with jittered exponential backoff. Worker threads
+# call the sync wrappers at the bottom and block only on their own request.
+PROVIDER_TIMEOUT = float(os.getenv("PROVIDER_TIMEOUT", "60"))
+PROVIDER_RETRIES = int(os.getenv("PROVIDER_RETRIES", "3"))
+PROVIDER_BACKOFF = float(os.getenv("PROVIDER_BACKOFF", "0.5"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "32"))
+PER_HOST_LIMIT = int(os.getenv("PER_HOST_LIMIT", "8"))
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+_loop = None
+_loop_lock = threading.Lock()
+_client = None
+_host_slots = {}
+
+
+def _reset_after_fork():
+    # A forked worker process inherits the loop object but not its thread
+    global _loop, _client, _loop_lock
+    _loop = None
+    _client = None
+    _loop_lock = threading.Lock()
+    _host_slots.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _get_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            # Blocking SDK calls run here; the default executor is too small for many overlapped waits
+            _loop.set_default_executor(ThreadPoolExecutor(max_workers=HTTP_MAX_CONNECTIONS, thread_name_prefix="providers"))
+            threading.Thread(target=_loop.run_forever, name="providers-loop", daemon=True).start()
+        return _loop
+
+
+def _get_client():
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(PROVIDER_TIMEOUT, connect=10.0),
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS),
+            follow_redirects=True,
+        )
+    return _client
+
+
+def _host_slot(host):
+    slot = _host_slots.get(host)
+    if slot is None:
+        slot = _host_slots[host] = asyncio.Semaphore(PER_HOST_LIMIT)
+    return slot
+
+
+def _is_retryable(error):
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS
+    if isinstance(error, (httpx.TransportError, asyncio.TimeoutError, ConnectionError, TimeoutError)):
+        return True
+    # The SDKs wrap timeouts and dropped connections (APITimeoutError is a subclass) without a status
+    if isinstance(error, (openai.APIConnectionError, together.APIConnectionError)):
+        return True
+    if isinstance(error, gTTSError):
+        # No response means gTTS could not connect; otherwise the status decides (429 when throttled)
+        return error.rsp is None or error.rsp.status_code in RETRYABLE_STATUS
+    # SDK errors (openai, together) expose the HTTP status as status_code
+    status = getattr(error, "status_code", None)
+    return status in RETRYABLE_STATUS
+
+
+async def with_retries(host, make_call, retries=None):
+    """
+    Await make_call() under the host's concurrency limit, retrying transient errors.
+
+    Backoff is "full jitter": a random wait between 0 and PROVIDER_BACKOFF * 2**attempt,
+    so clients throttled together do not retry together.
+    """
+    retries = PROVIDER_RETRIES if retries is None else retries
+    for attempt in range(retries + 1):
+        try:
+            async with _host_slot(host):
+                return await make_call()
+        except Exception as e:
+            if attempt == retries or not _is_retryable(e):
+                raise
+            delay = random.uniform(0, PROVIDER_BACKOFF * (2 ** attempt))
+            logger.warning(f"{host} call failed ({e!r}), retry {attempt + 1}/{retries} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+async def call_blocking(host, func, *args, **kwargs):
+    """
+    Run a blocking SDK call off the loop, with the host limit and retries.
+
+    The call is never timed out from here: an abandoned executor thread would keep
+    going, and the retry would run alongside it (a second paid request, or two writers
+    on one file). The SDK clients are created with PROVIDER_TIMEOUT and their own
+    retries turned off instead, so each attempt ends by itself and only this layer retries.
+    """
+    loop = asyncio.get_running_loop()
+
+    async def make_call():
+        return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+    return await with_retries(host, make_call)
+
+
+async def fetch(url):
+    """Fetch url over the shared connection pool and return the body as bytes."""
+    host = urlsplit(url).hostname or url
+
+    async def make_call():
+        response = await _get_client().get(url)
+        response.raise_for_status()
+        return response.content
+
+    return await with_retries(host, make_call)
+
+
+def run(coro):
+    """Run a coroutine on the shared provider loop and wait for its result."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+
+def call(host, func, *args, **kwargs):
+    """Sync wrapper around call_blocking, for use from worker threads."""
+    return run(call_blocking(host, func, *args, **kwargs))
+
+
+def fetch_bytes(url):
+    """Sync wrapper around fetch, for use from worker threads."""
+    return run(fetch(url))
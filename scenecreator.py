@@ -2,6 +2,14 @@ from openai import OpenAI
 import os
 from dotenv import load_dotenv
 from prompts import SCENE_GENERATION_PROMPT
+from singleflight import SingleFlight
+from metrics import PROVIDER_SECONDS
+import providers
+from collections import OrderedDict
+import copy
+import json
+import threading
+import time
 
 # Load environment variables from .env file
 load_dotenv()
@@ -13,32 +21,279 @@ Open_api_key = os.getenv("OPENAI_API_KEY")
 
 
 
+# Each attempt times out after PROVIDER_TIMEOUT; providers.call does the retrying, so the SDK's own is off
 client = OpenAI(
   base_url="https://openrouter.ai/api/v1",
   api_key=Open_api_key,
+  timeout=providers.PROVIDER_TIMEOUT,
+  max_retries=0,
 )
-def createscenes(topic, num_scenes):
+def createscenes(topic, num_scenes, stream=False):
     
     prompt = SCENE_GENERATION_PROMPT.format(topic=topic, num_scenes=num_scenes)
-    completion = client.chat.completions.create(
-    extra_headers={
-        "HTTP-Referer": "<YOUR_SITE_URL>", # Optional. Site URL for rankings on openrouter.ai.
-        "X-Title": "Text 2 Video", # Optional. Site title for rankings on openrouter.ai.
-    },
-    extra_body={},
-    model="qwen/qwen3-1.7b:free",
-    messages=[
-        {
-        "role": "user",
-        "content": [
+    with PROVIDER_SECONDS.time(provider="openrouter"):
+        completion = providers.call("openrouter.ai", client.chat.completions.create,
+        stream=stream,
+        extra_headers={
+            "HTTP-Referer": "<YOUR_SITE_URL>", # Optional. Site URL for rankings on openrouter.ai.
+            "X-Title": "Text 2 Video", # Optional. Site title for rankings on openrouter.ai.
+        },
+        extra_body={},
+        model="qwen/qwen3-1.7b:free",
+        messages=[
             {
-            "type": "text",
-            "text": prompt
-            }
+            "role": "user",
+            "content": [
+                {
+                "type": "text",
+                "text": prompt
+                }
             
+            ]
+            }
         ]
-        }
-    ]
-    )
+        )
+    if stream:
+        return completion
     result=completion.choices[0].message.content
-    return result
\ No newline at end of file
+    return result
+
+
+def createscenes_stream(topic, num_scenes):
+    """Yield the text of the LLM response for a topic chunk by chunk, as it is generated."""
+    for chunk in createscenes(topic, num_scenes, stream=True):
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+# Parsed scene plans are cached per (topic, num_scenes) for SCENE_CACHE_TTL seconds,
+# at most SCENE_CACHE_SIZE of them (least recently used go first), and identical
+# requests arriving together share a single LLM call.
+SCENE_CACHE_TTL = int(os.getenv("SCENE_CACHE_TTL", "600"))
+SCENE_CACHE_SIZE = int(os.getenv("SCENE_CACHE_SIZE", "256"))
+# stream_scenes reads the LLM response as it is generated; set SCENE_STREAMING=0 to
+# wait for the whole response instead
+SCENE_STREAMING = os.getenv("SCENE_STREAMING", "1").lower() in ("1", "true", "yes")
+_scene_cache = OrderedDict()
+_scene_cache_lock = threading.Lock()
+_scene_flight = SingleFlight()
+_scene_streams = {}
+
+
+def parse_scenes(result):
+    """Parse the LLM response into the list of scene dicts."""
+    scenes = result.strip("```json\n").strip()
+    scenes_data = json.loads(scenes)
+    return scenes_data.get("scenes", [])
+
+
+def iter_scene_objects(chunks):
+    """
+    Yield each scene dict from a streamed JSON response as soon as it is complete.
+
+    Scans for the "scenes" array and decodes one element at a time with raw_decode,
+    waiting for more chunks whenever the next element is still incomplete.
+
+    :param chunks: An iterable of response text chunks.
+    :return: A generator of scene dicts. Its return value is the full response text.
+    """
+    decoder = json.JSONDecoder()
+    text = ""
+    position = None
+    finished = False
+    for chunk in chunks:
+        text += chunk
+        if finished:
+            continue
+        if position is None:
+            start = text.find('"scenes"')
+            bracket = text.find("[", start) if start != -1 else -1
+            if bracket == -1:
+                continue
+            position = bracket + 1
+        while True:
+            while position < len(text) and text[position] in " \t\r\n,":
+                position += 1
+            if position >= len(text):
+                break
+            if text[position] == "]":
+                finished = True
+                break
+            try:
+                scene, position = decoder.raw_decode(text, position)
+            except ValueError:
+                break
+            yield scene
+    return text
+
+
+def _cache_plan(topic, num_scenes, scenes_array):
+    if scenes_array and SCENE_CACHE_TTL > 0 and SCENE_CACHE_SIZE > 0:
+        with _scene_cache_lock:
+            _scene_cache[(topic, num_scenes)] = (time.time() + SCENE_CACHE_TTL, scenes_array)
+            _scene_cache.move_to_end((topic, num_scenes))
+            while len(_scene_cache) > SCENE_CACHE_SIZE:
+                _scene_cache.popitem(last=False)
+
+
+def _cached_plan(topic, num_scenes):
+    key = (topic, num_scenes)
+    with _scene_cache_lock:
+        entry = _scene_cache.get(key)
+        if entry is not None and entry[0] < time.time():
+            del _scene_cache[key]
+            entry = None
+        elif entry is not None:
+            _scene_cache.move_to_end(key)
+    return copy.deepcopy(entry[1]) if entry is not None else None
+
+
+def _plan(topic, num_scenes):
+    scenes_array = parse_scenes(createscenes(topic, num_scenes))
+    _cache_plan(topic, num_scenes, scenes_array)
+    return scenes_array
+
+
+class _SceneStream:
+    """
+    One streamed scene plan in flight, shared with identical requests that arrive while it runs.
+
+    The request that started it publishes each scene as it is parsed; the others
+    replay the scenes published so far and then follow along.
+    """
+
+    def __init__(self):
+        self.scenes = []
+        self.done = False
+        self.error = None
+        self.cond = threading.Condition()
+
+    def publish(self, scene):
+        with self.cond:
+            self.scenes.append(scene)
+            self.cond.notify_all()
+
+    def finish(self, error=None):
+        with self.cond:
+            self.done = True
+            self.error = error
+            self.cond.notify_all()
+
+    def follow(self):
+        """Yield copies of the plan's scenes, waiting for each one to be published."""
+        index = 0
+        while True:
+            with self.cond:
+                while index >= len(self.scenes) and not self.done:
+                    self.cond.wait()
+                if index == len(self.scenes):
+                    if self.error is not None:
+                        raise self.error
+                    return
+                scene = self.scenes[index]
+            index += 1
+            yield copy.deepcopy(scene)
+
+    def result(self):
+        """Wait for the whole plan and return a copy of it."""
+        return list(self.follow())
+
+
+def plan_scenes(topic, num_scenes):
+    """
+    Return the parsed scenes for a topic, reusing a cached or in-flight plan when possible.
+
+    :param topic: The topic of the video.
+    :param num_scenes: How many scenes to plan.
+    :return: A list of scene dicts (a copy, safe to modify).
+    """
+    scenes_array = _cached_plan(topic, num_scenes)
+    if scenes_array is not None:
+        return scenes_array
+    with _scene_cache_lock:
+        stream = _scene_streams.get((topic, num_scenes))
+    if stream is not None:
+        return stream.result()
+    return copy.deepcopy(_scene_flight.do((topic, num_scenes), _plan, topic, num_scenes))
+
+
+def stream_scenes(topic, num_scenes):
+    """
+    Yield the scenes for a topic one by one, each as soon as the LLM has written it.
+
+    This lets the assets of the first scenes be requested while later scenes are
+    still being generated. Cached plans are yielded straight away. If the streamed
+    response cannot be parsed incrementally, the whole response is parsed at the end
+    and the scenes not yielded yet follow. Identical requests streaming at the same
+    time share one LLM call, as plan_scenes does.
+
+    :param topic: The topic of the video.
+    :param num_scenes: How many scenes to plan.
+    :return: A generator of scene dicts (copies, safe to modify).
+    """
+    scenes_array = _cached_plan(topic, num_scenes)
+    if scenes_array is None and not SCENE_STREAMING:
+        scenes_array = plan_scenes(topic, num_scenes)
+    if scenes_array is not None:
+        yield from scenes_array
+        return
+
+    key = (topic, num_scenes)
+    with _scene_cache_lock:
+        stream = _scene_streams.get(key)
+        leader = stream is None
+        if leader:
+            stream = _scene_streams[key] = _SceneStream()
+    if not leader:
+        # The same plan is already being streamed for another request
+        yield from stream.follow()
+        return
+
+    plan = _streamed_plan(topic, num_scenes)
+    try:
+        for scene in plan:
+            stream.publish(scene)
+            yield copy.deepcopy(scene)
+    except GeneratorExit:
+        # The caller stopped early; finish the plan for the requests following it
+        threading.Thread(target=_drain, args=(key, stream, plan), daemon=True).start()
+        raise
+    except Exception as e:
+        _finish_stream(key, stream, e)
+        raise
+    _finish_stream(key, stream)
+
+
+def _streamed_plan(topic, num_scenes):
+    """Yield the scenes of a fresh plan as the LLM writes them, and cache the plan at the end."""
+    scenes_array = []
+    parser = iter_scene_objects(createscenes_stream(topic, num_scenes))
+    while True:
+        try:
+            scene = next(parser)
+        except StopIteration as stop:
+            text = stop.value
+            break
+        scenes_array.append(scene)
+        yield scene
+
+    if not scenes_array:
+        scenes_array = parse_scenes(text)
+        yield from scenes_array
+    _cache_plan(topic, num_scenes, scenes_array)
+
+
+def _drain(key, stream, plan):
+    try:
+        for scene in plan:
+            stream.publish(scene)
+    except Exception as e:
+        _finish_stream(key, stream, e)
+    else:
+        _finish_stream(key, stream)
+
+
+def _finish_stream(key, stream, error=None):
+    with _scene_cache_lock:
+        _scene_streams.pop(key, None)
+    stream.finish(error)
@@ -0,0 +1,32 @@
+import os
+import sqlite3
+import threading
+
+
+def connect(db_path):
+    """Open a SQLite database in WAL mode, so the API and the render workers can share it."""
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class ThreadConnections:
+    """
+    One long-lived connection to a database per thread.
+
+    Opening a connection (and setting its pragmas) costs far more than the lookups
+    made on it, so each thread keeps its own. Forked worker processes open theirs
+    again rather than sharing the parent's.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def get(self):
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            local.conn = connect(self.db_path)
+            local.pid = os.getpid()
+        return local.conn
@@ -0,0 +1,190 @@
+import json
+import sqlitedb
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress INTEGER,
+    batch_id TEXT,
+    output_file TEXT,
+    output_bytes INTEGER,
+    preview_file TEXT,
+    preview_bytes INTEGER,
+    error TEXT,
+    data TEXT NOT NULL DEFAULT '{}',
+    version INTEGER NOT NULL DEFAULT 1,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    purged_at REAL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS tasks_created ON tasks (created_at, task_id);
+CREATE INDEX IF NOT EXISTS tasks_state_created ON tasks (state, created_at, task_id);
+CREATE INDEX IF NOT EXISTS tasks_live_created ON tasks (created_at) WHERE purged_at IS NULL;
+"""
+
+# Fields kept in their own columns; any other status field goes into the data JSON
+COLUMNS = (
+    "state", "status", "progress", "batch_id", "output_file", "output_bytes", "preview_file", "preview_bytes",
+    "error", "created_at", "updated_at", "started_at", "finished_at", "purged_at",
+)
+FINAL_STATES = ("SUCCESS", "FAILURE", "PREVIEW")
+
+
+class TaskStore:
+    """
+    Every task's status, current and historical, in one SQLite table.
+
+    A task is one row keyed by its id, so reading or writing a status is a primary
+    key lookup, and listing tasks by state or age walks an index instead of the temp
+    directory. update() merges the new fields into the row in a single transaction,
+    so readers (including other processes, such as `main.py --worker` render workers)
+    see either the old status or the new one, never half of it. Rows outlive the task
+    directories: cleaning up a task only marks it purged.
+
+    :param db_path: Path to the SQLite database shared with the workers.
+    :param state_of: Maps a status string to its state (PROGRESS, PREVIEW, SUCCESS or FAILURE).
+    """
+
+    def __init__(self, db_path, state_of):
+        self.db_path = db_path
+        self.state_of = state_of
+        self._cond = threading.Condition()
+        self._connections = sqlitedb.ThreadConnections(db_path)
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        return self._connections.get()
+
+    def update(self, task_id, **fields):
+        """Merge fields into the task's status, creating the task if needed, and notify waiters."""
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                f"SELECT version, data, {', '.join(COLUMNS)} FROM tasks WHERE task_id = ?", (task_id,)
+            ).fetchone()
+            if row is None:
+                version, data, task = 0, {}, {"created_at": now}
+            else:
+                version, data, task = row[0], json.loads(row[1]), dict(zip(COLUMNS, row[2:]))
+            previous_state = task.get("state")
+            for key, value in fields.items():
+                if key in COLUMNS:
+                    task[key] = value
+                else:
+                    data[key] = value
+            state = task["state"] = self.state_of(task["status"])
+            task["updated_at"] = now
+            if task.get("status") == "Queued":
+                # Queued again by /retry or /render: timings start over
+                task["started_at"] = task["finished_at"] = None
+            elif task.get("started_at") is None:
+                task["started_at"] = now
+            if state in FINAL_STATES and previous_state != state:
+                task["finished_at"] = now
+            task["error"] = task["status"][len("Error: "):] if task["status"].startswith("Error") else None
+
+            values = [task.get(column) for column in COLUMNS]
+            conn.execute(
+                f"INSERT OR REPLACE INTO tasks (task_id, data, version, {', '.join(COLUMNS)}) "
+                f"VALUES (?, ?, ?, {', '.join('?' * len(COLUMNS))})",
+                [task_id, json.dumps(data), version + 1] + values,
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        with self._cond:
+            self._cond.notify_all()
+
+    def get(self, task_id):
+        """Return (version, status dict) for a task, or (0, None) if it does not exist."""
+        cursor = self._conn().execute(
+            f"SELECT version, data, {', '.join(COLUMNS)} FROM tasks WHERE task_id = ?", (task_id,)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return 0, None
+        return row[0], _status(row[1], row[2:])
+
+    def wait(self, task_id, version, timeout, poll=1.0):
+        """
+        Block until the task's version is newer than `version` or `timeout` passes.
+
+        In-process updates wake waiters immediately; changes made by other processes
+        are picked up every `poll` seconds. Returns the same (version, data) as get().
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            current = self.get(task_id)
+            remaining = deadline - time.monotonic()
+            if current[0] > version or current[1] is None or remaining <= 0:
+                return current
+            with self._cond:
+                self._cond.wait(min(poll, remaining))
+
+    def list(self, state=None, limit=100, after=None):
+        """
+        Tasks newest first, optionally only those in one state.
+
+        Pages are keyed on (created_at, task_id), so each page is an index range scan
+        however many tasks came before it.
+
+        :param limit: Maximum number of tasks, or None for all of them.
+        :param after: task_id of the last task of the previous page.
+        :return: List of (task_id, status dict).
+        """
+        where, params = [], []
+        if state is not None:
+            where.append("state = ?")
+            params.append(state)
+        if after is not None:
+            row = self._conn().execute("SELECT created_at FROM tasks WHERE task_id = ?", (after,)).fetchone()
+            if row is None:
+                return []
+            where.append("(created_at, task_id) < (?, ?)")
+            params += [row[0], after]
+        cursor = self._conn().execute(
+            f"SELECT task_id, data, {', '.join(COLUMNS)} FROM tasks "
+            f"{'WHERE ' + ' AND '.join(where) if where else ''} "
+            "ORDER BY created_at DESC, task_id DESC LIMIT ?",
+            params + [-1 if limit is None else limit],
+        )
+        return [(row[0], _status(row[1], row[2:])) for row in cursor]
+
+    def expired(self, created_before):
+        """(task_id, batch_id) of the tasks created before the given time whose files are not purged yet."""
+        return self._conn().execute(
+            "SELECT task_id, batch_id FROM tasks WHERE purged_at IS NULL AND created_at < ? ORDER BY created_at",
+            (created_before,),
+        ).fetchall()
+
+    def purge(self, task_id):
+        """Record that a task's files were deleted; its status stays in the history."""
+        self._conn().execute(
+            "UPDATE tasks SET purged_at = ?, version = version + 1 WHERE task_id = ? AND purged_at IS NULL",
+            (time.time(), task_id),
+        )
+        with self._cond:
+            self._cond.notify_all()
+
+    def delete(self, task_id):
+        self._conn().execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+
+    def count(self, state=None):
+        if state is None:
+            return self._conn().execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+        return self._conn().execute("SELECT COUNT(*) FROM tasks WHERE state = ?", (state,)).fetchone()[0]
+
+
+def _status(data, values):
+    status = json.loads(data)
+    status.update((column, value) for column, value in zip(COLUMNS, values) if value is not None)
+    return status
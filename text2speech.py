@@ -1,6 +1,171 @@
 from gtts import gTTS
+from dotenv import load_dotenv
+from filecache import FileCache
+from singleflight import SingleFlight
+from metrics import PROVIDER_SECONDS, BYTES_WRITTEN
+import json
 import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import providers
 
+# Load environment variables from .env file
+load_dotenv()
+
+# TTS_ENGINE picks the backend: "gtts" (Google, over the network, writes MP3),
+# "espeak-ng" or "piper" (local, on this machine's CPU, write WAV).
+TTS_ENGINE = os.getenv("TTS_ENGINE", "gtts")
+ESPEAK_BIN = os.getenv("ESPEAK_BIN", "espeak-ng")
+ESPEAK_VOICE = os.getenv("ESPEAK_VOICE")
+PIPER_BIN = os.getenv("PIPER_BIN", "piper")
+PIPER_MODEL = os.getenv("PIPER_MODEL")
+PIPER_PROCESSES = int(os.getenv("PIPER_PROCESSES", str(min(4, os.cpu_count() or 1))))
+
+
+class TTSBackend:
+    """A text-to-speech engine. Subclasses write one narration to an audio file."""
+
+    name = None
+    suffix = ".wav"
+
+    def cache_tag(self):
+        """Identifies the engine and voice in cache keys, so voices never share entries."""
+        return self.name
+
+    def synthesize(self, text, lang, path):
+        raise NotImplementedError
+
+
+class GTTSBackend(TTSBackend):
+    """Google Translate's TTS, one HTTP round-trip per narration."""
+
+    name = "gtts"
+    suffix = ".mp3"
+
+    def synthesize(self, text, lang, path):
+        # Create a gTTS object
+        tts = gTTS(text=text, lang=lang, timeout=providers.PROVIDER_TIMEOUT)
+        providers.call("translate.google.com", tts.save, path)
+
+
+class EspeakBackend(TTSBackend):
+    """espeak-ng on the local CPU, one short-lived process per narration."""
+
+    name = "espeak-ng"
+
+    def cache_tag(self):
+        return f"{self.name}:{ESPEAK_VOICE or ''}"
+
+    def synthesize(self, text, lang, path):
+        if shutil.which(ESPEAK_BIN) is None:
+            raise RuntimeError(f"TTS_ENGINE=espeak-ng but {ESPEAK_BIN} is not installed")
+        result = subprocess.run(
+            [ESPEAK_BIN, "-v", ESPEAK_VOICE or lang, "-w", path, "--stdin"],
+            input=text.encode("utf-8"), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"espeak-ng failed: {result.stderr.decode(errors='replace').strip()}")
+
+
+class PiperBackend(TTSBackend):
+    """
+    Piper neural TTS on the local CPU.
+
+    Up to PIPER_PROCESSES piper processes are started with --json-input and kept
+    running. Each one loads the voice model once and then synthesizes narrations
+    one line after another, so every scene of every job goes through an already
+    loaded model. Concurrent scenes use separate processes, which spreads the work
+    over the cores. The voice comes from PIPER_MODEL, so `lang` is ignored.
+    """
+
+    name = "piper"
+
+    def __init__(self):
+        self._idle = []
+        self._cond = threading.Condition()
+        self._started = 0
+
+    def cache_tag(self):
+        return f"{self.name}:{os.path.basename(PIPER_MODEL or '')}"
+
+    def _start(self):
+        if not PIPER_MODEL:
+            raise RuntimeError("TTS_ENGINE=piper needs PIPER_MODEL set to a voice model (.onnx)")
+        if shutil.which(PIPER_BIN) is None:
+            raise RuntimeError(f"TTS_ENGINE=piper but {PIPER_BIN} is not installed")
+        return subprocess.Popen(
+            [PIPER_BIN, "--model", PIPER_MODEL, "--json-input", "--output_dir", tempfile.gettempdir()],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, bufsize=1,
+        )
+
+    def _acquire(self):
+        # Take an idle process, start one if there is room, or wait for one to be returned or dropped
+        with self._cond:
+            while not self._idle and self._started >= PIPER_PROCESSES:
+                self._cond.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._started += 1
+        try:
+            return self._start()
+        except Exception:
+            self._forget()
+            raise
+
+    def _forget(self):
+        with self._cond:
+            self._started -= 1
+            self._cond.notify()
+
+    def synthesize(self, text, lang, path):
+        proc = self._acquire()
+        try:
+            proc.stdin.write(json.dumps({"text": text, "output_file": os.path.abspath(path)}) + "\n")
+            proc.stdin.flush()
+            # piper prints the path of each file once it is written
+            if not proc.stdout.readline():
+                raise RuntimeError(f"piper exited with {proc.wait()}")
+        except Exception:
+            proc.kill()
+            proc.wait()
+            # A waiting caller starts a replacement
+            self._forget()
+            raise
+        with self._cond:
+            self._idle.append(proc)
+            self._cond.notify()
+
+
+TTS_BACKENDS = {backend.name: backend for backend in (GTTSBackend, EspeakBackend, PiperBackend)}
+if TTS_ENGINE not in TTS_BACKENDS:
+    raise ValueError(f"Unknown TTS_ENGINE {TTS_ENGINE!r}, expected one of {', '.join(TTS_BACKENDS)}")
+tts_backend = TTS_BACKENDS[TTS_ENGINE]()
+
+# Narration is cached by (text, lang, engine and voice), so repeated lines such as
+# intros, outros or retried renders skip synthesis.
+AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", os.path.join("cache", "audio"))
+AUDIO_CACHE_MAX_MB = int(os.getenv("AUDIO_CACHE_MAX_MB", "256"))
+audio_cache = FileCache(AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_MB * 1024 * 1024, suffix=tts_backend.suffix, name="audio")
+_tts_flight = SingleFlight()
+
+
+def _synthesize(text, lang, cache_key, filepath):
+    """Write the narration to filepath, from the cache or from the TTS engine, and return filepath."""
+    if audio_cache.fetch(cache_key, filepath):
+        print(f"Audio for {filepath} served from cache")
+        return filepath
+
+    # Save the audio file. Write beside it and rename, since filepath may be a hardlink
+    # into the cache and must not be overwritten in place.
+    with PROVIDER_SECONDS.time(provider=tts_backend.name):
+        tts_backend.synthesize(text, lang, filepath + ".part")
+    os.replace(filepath + ".part", filepath)
+    BYTES_WRITTEN.inc(os.path.getsize(filepath), kind="audio")
+    audio_cache.store(cache_key, filepath)
+    print(f"Audio saved as {filepath}")
+    return filepath
 
 
 def text2speech(text,filename, lang='en',output_dir="Audio"):
@@ -9,15 +174,19 @@ def text2speech(text,filename, lang='en',output_dir="Audio"):
 
     :param text: The text to convert to speech.
     :param lang: The language in which to convert the text (default is English).
-    :param filename: The name of the output audio file (default is 'output.mp3').
+    :param filename: The name of the output audio file, without extension.
+    :param output_dir: Where to write the file.
+    :return: The path written: filename.mp3 with gTTS, filename.wav with a local engine.
     """
-    
-    # Create a gTTS object
-    tts = gTTS(text=text, lang=lang)
 
-    # Save the audio file
-    
     os.makedirs(output_dir, exist_ok=True)
-    filepath = os.path.join(output_dir, filename+".mp3")
-    tts.save(filepath)
-    print(f"Audio saved as {filename}")
+    filepath = os.path.join(output_dir, filename+tts_backend.suffix)
+
+    cache_key = audio_cache.make_key(text=text, lang=lang, engine=tts_backend.cache_tag())
+    # Identical narrations requested at the same time (e.g. across a batch) share one synthesis
+    source = _tts_flight.do(cache_key, _synthesize, text, lang, cache_key, filepath)
+    if source != filepath and not audio_cache.fetch(cache_key, filepath):
+        shutil.copyfile(source, filepath + ".part")
+        os.replace(filepath + ".part", filepath)
+        print(f"Audio for {filename} shared with {source}")
+    return filepath